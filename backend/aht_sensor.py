@@ -2,14 +2,7 @@
 
 import logging
 
-try:  # pragma: no cover - hardware optional
-    import board
-    import busio
-    import adafruit_ahtx0
-except Exception as e:  # pragma: no cover - no hardware in tests
-    board = busio = adafruit_ahtx0 = None
-    logging.error("AHT20 libs not available: %s", e)
-
+from . import drivers
 
 log = logging.getLogger(__name__)
 
@@ -22,6 +15,8 @@ class AHTSensor:
         self._sensor = None
 
     def _init_sensor(self):
+        board, busio = drivers.get("board"), drivers.get("busio")
+        adafruit_ahtx0 = drivers.get("ahtx0")
         if board is None or busio is None or adafruit_ahtx0 is None:
             return
         try:
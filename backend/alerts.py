@@ -0,0 +1,213 @@
+"""Declarative alert rules evaluated incrementally on every frame.
+
+A rule is a dict, by default from ``RULES`` or from ``alerts.json`` if that
+file exists::
+
+    {"name": "v24-overcurrent", "type": "threshold", "field": "voltageSensorV24.current",
+     "above": 1.8, "hysteresis": 0.1, "level": "critical"}
+
+Types and their options:
+
+``threshold``  ``above`` and/or ``below``, ``hysteresis`` to clear
+``rate``       ``max`` absolute change per second
+``zscore``     ``z`` limit against an EWMA mean/variance with weight ``alpha``,
+               after ``warmup`` frames; ``min_std`` keeps a flat signal quiet
+``dropout``    on an ``isAvailable`` field: ``flaps`` changes within about
+               ``window`` s, or unavailable for ``down`` s once it has been
+               available (a sensor that is not fitted stays quiet)
+
+Rules on a sensor value are skipped while that sensor's ``isAvailable`` is
+false.  Every rule keeps a few numbers of state, so a frame costs O(rules).  Edges
+(fired / cleared) go to the sinks passed to ``AlertEngine``.
+"""
+
+import json
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import frame
+
+log = logging.getLogger(__name__)
+
+RULES_PATH = "alerts.json"
+HISTORY = 100            # fired / cleared events kept for the API
+
+RULES = [
+    {"name": "v24-overcurrent", "type": "threshold", "field": "voltageSensorV24.current",
+     "above": 1.8, "hysteresis": 0.1, "level": "critical"},
+    {"name": "v24-undervoltage", "type": "threshold", "field": "voltageSensorV24.voltage",
+     "below": 22.0, "hysteresis": 0.3, "level": "warning"},
+    {"name": "v5-undervoltage", "type": "threshold", "field": "voltageSensorV5PiBrain.voltage",
+     "below": 4.75, "hysteresis": 0.05, "level": "critical"},
+    {"name": "v24-current-step", "type": "rate", "field": "voltageSensorV24.current",
+     "max": 5.0, "level": "warning"},
+    {"name": "v24-power-anomaly", "type": "zscore", "field": "voltageSensorV24.power",
+     "z": 6.0, "alpha": 0.01, "warmup": 200, "level": "warning"},
+    {"name": "overheat-1", "type": "threshold", "field": "temperatureSensor1.temperature",
+     "above": 60.0, "hysteresis": 2.0, "level": "critical"},
+    {"name": "overheat-2", "type": "threshold", "field": "temperatureSensor2.temperature",
+     "above": 60.0, "hysteresis": 2.0, "level": "critical"},
+] + [
+    {"name": f"{s}-dropout", "type": "dropout", "field": f"{s}.isAvailable",
+     "flaps": 4, "window": 10.0, "down": 5.0, "level": "warning"}
+    for s in frame.VOLTAGE_SENSORS + frame.TEMP_SENSORS
+]
+
+
+class _Check:
+    def reset(self) -> None:
+        """The frame has no usable value (sensor unavailable or field missing)."""
+
+
+class _Threshold(_Check):
+    def __init__(self, above=None, below=None, hysteresis=0.0, **_):
+        self.above, self.below, self.hyst = above, below, hysteresis
+
+    def update(self, v: float, dt: float, active: bool) -> bool:
+        h = self.hyst if active else 0.0
+        return ((self.above is not None and v > self.above - h)
+                or (self.below is not None and v < self.below + h))
+
+
+class _Rate(_Check):
+    def __init__(self, max, **_):
+        self.max = max
+        self.last: Optional[float] = None
+
+    def update(self, v: float, dt: float, active: bool) -> bool:
+        last, self.last = self.last, v
+        if last is None or dt <= 0:
+            return active
+        return abs(v - last) / dt > self.max
+
+    def reset(self) -> None:
+        self.last = None        # no rate across the gap
+
+
+class _ZScore(_Check):
+    def __init__(self, z=5.0, alpha=0.01, warmup=100, min_std=0.01, **_):
+        self.z, self.alpha, self.warmup = z, alpha, warmup
+        self.min_var = min_std * min_std
+        self.n = 0
+        self.mean = self.var = 0.0
+
+    def update(self, v: float, dt: float, active: bool) -> bool:
+        self.n += 1
+        if self.n == 1:
+            self.mean = v
+            return False
+        d = v - self.mean
+        out = (self.n > self.warmup
+               and d * d > self.z * self.z * max(self.var, self.min_var))
+        if not out:             # keep outliers out of the baseline
+            self.mean += self.alpha * d
+            self.var = (1 - self.alpha) * (self.var + self.alpha * d * d)
+        return out
+
+
+class _Dropout(_Check):
+    def __init__(self, flaps=4, window=10.0, down=5.0, **_):
+        self.flaps, self.window, self.down = flaps, window, down
+        self.state: Optional[bool] = None
+        self.count = 0.0        # changes, decaying with time constant ``window``
+        self.off_for = 0.0
+        self.seen = False       # ever available
+
+    def update(self, v: float, dt: float, active: bool) -> bool:
+        self.count *= math.exp(-dt / self.window) if dt > 0 else 1.0
+        up = bool(v)
+        if self.state is not None and up != self.state:
+            self.count += 1
+        self.state = up
+        self.seen = self.seen or up
+        self.off_for = 0.0 if up else self.off_for + dt
+        flapping = self.count >= (self.flaps / 2 if active else self.flaps)
+        return flapping or (self.seen and self.off_for >= self.down)
+
+
+_TYPES = {"threshold": _Threshold, "rate": _Rate, "zscore": _ZScore, "dropout": _Dropout}
+
+
+class _Rule:
+    __slots__ = ("name", "level", "field", "group", "key", "gated", "check", "active", "since")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.level = spec.get("level", "warning")
+        self.field = spec["field"]
+        if self.field not in frame.FIELDS:
+            raise ValueError(f"{self.name}: unknown field {self.field}")
+        self.group, _, self.key = self.field.partition(".")
+        self.gated = (self.key != "isAvailable"
+                      and f"{self.group}.isAvailable" in frame.FIELDS)
+        opts = {k: v for k, v in spec.items() if k not in ("name", "type", "level", "field")}
+        self.check = _TYPES[spec["type"]](**opts)
+        self.active = False
+        self.since = 0.0
+
+
+def load_rules(path: str = RULES_PATH) -> List[Dict[str, Any]]:
+    """Rules from ``path`` if it exists and is valid, else ``RULES``."""
+    try:
+        with open(path) as f:
+            rules = json.load(f)
+        for spec in rules:
+            _Rule(spec)         # unknown type or field, bad options
+    except FileNotFoundError:
+        return RULES
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        log.error("ignoring %s, using the built-in rules: %r", path, e)
+        return RULES
+    return rules
+
+
+class AlertEngine:
+    def __init__(self, rules: Iterable[Dict[str, Any]],
+                 sinks: Iterable[Callable[[Dict[str, Any]], None]] = ()):
+        self.rules = [_Rule(r) for r in rules]
+        self.sinks = list(sinks)
+        self.events = deque(maxlen=HISTORY)
+        self._ts: Optional[int] = None
+
+    def add(self, pkts: Iterable[Dict[str, Any]]) -> None:
+        for pkt in pkts:
+            ts = pkt.get("ts") or 0
+            dt = ((ts - self._ts) & 0xFFFFFFFF) / 1000.0 if self._ts is not None else 0.0
+            self._ts = ts
+            for r in self.rules:
+                if not r.key:
+                    v = pkt.get(r.group)
+                else:
+                    g = pkt.get(r.group) or {}
+                    v = g.get(r.key)
+                    if r.gated and not g.get("isAvailable"):
+                        v = None
+                if v is None:
+                    r.check.reset()
+                    continue
+                active = r.check.update(v, dt, r.active)
+                if active != r.active:
+                    r.active = active
+                    self._emit(r, v, pkt.get("rx") or time.time())
+
+    def _emit(self, r: _Rule, value, t: float) -> None:
+        if r.active:
+            r.since = t
+        event = {"rule": r.name, "level": r.level, "field": r.field, "value": value,
+                 "state": "fired" if r.active else "cleared", "t": t}
+        self.events.append(event)
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                log.warning("alert sink failed: %s", e)
+
+    def active(self) -> List[Dict[str, Any]]:
+        return [{"rule": r.name, "level": r.level, "field": r.field, "since": r.since}
+                for r in self.rules if r.active]
+
+    def status(self) -> Dict[str, Any]:
+        return {"active": self.active(), "events": list(self.events)}
@@ -1,28 +1,153 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from .neopixel_controller import fill, off, set_brightness, run_animation
-from .telemetry_service import get_telemetry
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for
+from .neopixel_controller import (fill, off, set_brightness, run_animation, play, current,
+                                  Reactive, set_source, EFFECTS, MODES)
+from .telemetry_service import get_telemetry, sampler as pi_sampler
 from .temperature_sensor import read_temperature
 from .dht_sensor import read_data as read_dht
+from .aht_sensor import read_data as read_aht
+from .sensor_cache import SensorCache
+from .bus import TelemetryBus, receive, watch
+from .frame_store import FrameHistory, FrameStore
+from .stream import StreamHub
+from .delta import DeltaCursor, DeltaState
+from .history import HistoryStore
+from .energy import EnergyMeter
+from .alerts import AlertEngine, load_rules
+from .commands import CommandClient
+from . import drivers, frame, metrics, ring, serving
+import math
 import random
 import time
 import json
 import logging
-import queue
+import signal
 import threading
 
+# per-process state, built by _fresh_state() in run(), not at import
 _teency = {}
+_store = None           # shared-memory latest frame, set up in run()
+_hub = None             # /api/stream clients
+_delta = None           # changed fields for ?since= and delta streams
+_ring = None            # recent frames, None without NumPy
+_energy = None          # Wh per rail, saved to energy.json
+_commands = None        # to the Teensy, through the reader
+_alerts = None          # AlertEngine
+_sensors = None         # SensorCache of the Pi-side sensors
+_alert_leds = None      # effect shown for a critical alert, else None
+_led_before = None      # effect it replaced, restored when the alert clears
+_warm_until = 0.0       # rx of the last frame taken from the frame history
+
+
+def _alert_log(event):
+    level = logging.WARNING if event['state'] == 'fired' else logging.INFO
+    logging.log(level, "alert %s %s: %s = %s", event['rule'], event['state'],
+                event['field'], event['value'])
+
+
+def _alert_ui(event):
+    _hub.publish("alerts", _alerts.status())
+
+
+def _alert_led(event):
+    """Pulse red while any critical alert is active, then restore the effect."""
+    global _alert_leds, _led_before
+    critical = any(a['level'] == 'critical' for a in _alerts.active())
+    if critical and _alert_leds is None:
+        _led_before, _alert_leds = current(), EFFECTS['pulse']()
+        play(_alert_leds)
+    elif not critical and _alert_leds is not None:
+        if current() is _alert_leds:    # unless the operator changed it meanwhile
+            play(_led_before)
+        _alert_leds = _led_before = None
+
+
+_sse_clients = metrics.gauge('sse_clients', 'Open /api/stream connections')
+metrics.on_collect(lambda: _sse_clients.set(_hub.clients if _hub is not None else 0))
+STALE_AFTER = 3.0       # s without a frame before status turns "stale"
+
+def _sensor_cache():
+    """Pi-side sensors are only ever read by the cache threads, never per request."""
+    cache = SensorCache()
+    cache.add('dht11', read_dht, period=2.0)           # DHT11: max 1 Hz, flaky
+    cache.add('ds18b20', read_temperature, period=2.0)  # ~750 ms conversion
+    cache.add('aht20', read_aht, period=1.0)
+    return cache
+
+def _fresh_state():
+    """Build the per-process state, called by ``run``.
+
+    ``main.py`` imports this module once and forks every start and restart
+    of the flask worker from that copy, so nothing is built at import: a
+    restarted worker would go on from the energy totals loaded at boot, and
+    its next save would roll energy.json back to them.
+    """
+    global _teency, _hub, _delta, _ring, _energy, _commands, _alerts, _alert_leds, _led_before
+    global _sensors, _history, _warm_until
+    _teency, _history, _warm_until = {}, None, 0.0
+    _alert_leds = _led_before = None
+    _hub = StreamHub()
+    _delta = DeltaState()
+    _ring = ring.TelemetryRing() if ring.available() else None
+    _energy = EnergyMeter()         # the totals the previous worker saved
+    _commands = CommandClient()
+    _alerts = AlertEngine(load_rules(), sinks=(_alert_log, _alert_ui, _alert_led))
+    _sensors = _sensor_cache()
+
+def _warm_start():
+    """After a restart, refill the ring from the frames the reader kept."""
+    global _warm_until
+    hist = FrameHistory.attach()
+    if hist is None:
+        return
+    pkts = hist.frames()
+    hist.close()
+    if not pkts:
+        return
+    if _ring is not None:
+        _ring.append(pkts)
+    _warm_until = pkts[-1]["rx"]
+    logging.info("warm start with %d frames", len(pkts))
 
 def _listener(q):
-    global _teency
+    global _teency, _warm_until
     while True:
-        try:
-            pkt = q.get(timeout=1)
-            if pkt.get("type")=="telemetry":
-                _teency = pkt
-        except queue.Empty:
+        pkts = [p for p in receive(q) if p.get("type") == "telemetry"]
+        if not pkts:
+            continue
+        if _store is None:      # started without main.py
+            _teency = pkts[-1]
+        if _ring is not None:
+            new = pkts
+            if _warm_until:     # the pipe backlog overlaps the history
+                new = [p for p in pkts if p["rx"] > _warm_until]
+                if new:
+                    _warm_until = 0.0
+            _ring.append(new)
+        _energy.add(pkts)
+        _alerts.add(pkts)
+        if _hub.clients:
+            _hub.publish("teency", get_teency_data())
+
+def _sampler():
+    """Slow stream events, produced once for all clients."""
+    while True:
+        time.sleep(1)
+        _energy.tick()
+        if not _hub.clients:
             continue
+        _hub.publish("pi", get_telemetry())
+        _hub.publish("sensors", _sensor_readings())
+        teency = get_teency_data()
+        if teency["status"] != "ok":     # no frames to push it otherwise
+            _hub.publish("teency", teency)
 
 def get_teency_data():        # used by /api/teency etc.
+    if _store is not None:
+        _, rx, frame = _store.read()
+        if frame is None:
+            return {"status": "wait"}
+        status = "ok" if time.time() - rx < STALE_AFTER else "stale"
+        return {**frame, "status": status}
     if _teency:
         return {**_teency, "status": _teency.get("status", "ok")}
     return {"status": "wait"}
@@ -32,6 +157,7 @@ app = Flask(
     template_folder='../frontend/templates',
     static_folder='../frontend/static'
 )
+serving.setup(app)     # gzip, cache headers for frontend/static
 
 # start background reader for Teency telemetry
 
@@ -111,6 +237,8 @@ def voltage_control_page():
 def api_color():
     data = request.get_json()
     r, g, b = data.get('r',0), data.get('g',0), data.get('b',0)
+    if not all(type(c) is int and 0 <= c <= 255 for c in (r, g, b)):
+        return jsonify(status='error', error='r, g and b must be integers 0-255'), 400
     fill((r, g, b))
     return jsonify(status='ok', color=[r, g, b])
 
@@ -126,12 +254,47 @@ def api_brightness():
     set_brightness(value)
     return jsonify(status='ok', brightness=value)
 
+def _mapping_error(m):
+    """Why a custom reactive mapping is unusable, or ``None``.
+
+    Checked here because ``Reactive`` only fails later, in the LED thread.
+    """
+    if not isinstance(m, dict):
+        return 'mapping must be an object'
+    unknown = set(m) - {'field', 'mode', 'lo', 'hi', 'effect'}
+    if unknown:
+        return f"unknown keys: {', '.join(sorted(unknown))}"
+    if m.get('field') not in frame.FIELDS:
+        return 'field must be one of the telemetry fields, e.g. voltageSensorV24.current'
+    if m.get('mode', 'hue') not in MODES:
+        return f"mode must be one of {', '.join(MODES)}"
+    for k in ('lo', 'hi'):
+        v = m.get(k, 0.0)
+        if isinstance(v, bool) or not isinstance(v, (int, float)):
+            return f'{k} must be a number'
+    if m.get('effect', 'rainbow') not in EFFECTS:
+        return f"effect must be one of {', '.join(EFFECTS)}"
+    return None
+
 @app.post('/api/animation')
 def api_animation():
     data = request.get_json()
     name = data.get('name')
-    run_animation(name)
-    return jsonify(status='ok', animation=name)
+    try:
+        speed = float(data.get('speed', 1.0))
+    except (TypeError, ValueError):
+        speed = math.nan
+    if not math.isfinite(speed):
+        return jsonify(status='error', error='speed must be a number'), 400
+    if name == 'reactive':      # custom mapping, see neopixel_controller.Reactive
+        mapping = data.get('mapping', {})
+        error = _mapping_error(mapping)
+        if error:
+            return jsonify(status='error', error=error), 400
+        play(Reactive(**mapping))
+    else:
+        run_animation(name, speed)
+    return jsonify(status='ok', animation=name, speed=speed)
 
 
 @app.get('/api/status')
@@ -144,9 +307,15 @@ def api_telemetry():
     return jsonify(get_telemetry())
 
 
+@app.get('/api/telemetry/history')
+def api_telemetry_history():
+    """Pi telemetry samples of the last ``seconds`` (1 Hz, up to 10 min)."""
+    return jsonify(pi_sampler().series(request.args.get('seconds', 600, type=float)))
+
+
 @app.get('/api/temperature')
 def api_temperature():
-    temp = read_temperature()
+    temp = _sensors.get('ds18b20')
     return jsonify({'temperature': temp} if temp is not None else {})
 
 
@@ -181,7 +350,7 @@ def api_aht20():
 @app.get('/api/dht11')
 def api_dht11():
     """Return readings from the DHT11 sensor."""
-    data = read_dht()
+    data = _sensors.get('dht11')
     if data is None:
         return jsonify({'status': 'off'})
     return jsonify({'status': 'on', **data})
@@ -189,25 +358,228 @@ def api_dht11():
 
 @app.get('/api/teency')
 def api_teency():
-    """Return latest telemetry from the Teency board."""
-    return jsonify(get_teency_data())
+    """Return latest telemetry from the Teency board.
 
+    With ``since`` (and ``epoch``) from a previous delta response only the
+    changed fields are returned, see ``delta.py``.
+    """
+    since = request.args.get('since', type=int)
+    if since is None and request.args.get('delta') is None:
+        return jsonify(get_teency_data())
+    _delta.update(get_teency_data())
+    return jsonify(_delta.delta(since, request.args.get('epoch', type=int)))
 
-@app.get('/api/sensors')
-def api_sensors():
-    dht = read_dht()
-    return jsonify({
-        'teency': get_teency_data(),
-        'temperature': read_temperature(),
+
+def _sensor_readings():
+    dht = _sensors.get('dht11')
+    aht = _sensors.get('aht20')
+    return {
+        'temperature': _sensors.get('ds18b20'),
         'aht20': {'1': _teency_aht(1)},
+        'aht20_pi': {'status': 'on', **aht} if aht else {'status': 'off'},
         'dht11': {'status': 'on', **dht} if dht else {'status': 'off'},
-    })
+    }
+
+
+@app.get('/api/sensors')
+def api_sensors():
+    return jsonify({'teency': get_teency_data(), **_sensor_readings()})
+
+
+_history = None
+
+def _history_store():
+    """Read-only view of the logger's telemetry.db, opened on first use."""
+    global _history
+    if _history is None:
+        _history = HistoryStore(readonly=True)
+    return _history
+
+
+@app.get('/api/history')
+def api_history():
+    """Downsampled history of one telemetry field.
+
+    ``series`` is a dotted field name such as ``voltageSensorV24.current``;
+    ``from``/``to`` are epoch seconds, negative values are relative to now;
+    ``points`` bounds the result and ``mode`` is ``lttb`` or ``minmax``.
+    """
+    now = time.time()
+    t0 = request.args.get('from', -3600, type=float)
+    t1 = request.args.get('to', now, type=float)
+    t0, t1 = (now + t0 if t0 < 0 else t0), (now + t1 if t1 < 0 else t1)
+    points = max(2, min(request.args.get('points', 500, type=int), 5000))
+    mode = request.args.get('mode', 'lttb')
+    try:
+        return jsonify(_history_store().query(
+            request.args.get('series', ''), t0, t1, points, mode))
+    except KeyError:
+        return jsonify({'error': 'unknown series'}), 400
+    except Exception as e:
+        logging.warning("history query failed: %s", e)
+        return jsonify({'error': 'history unavailable'}), 503
+
+
+@app.get('/api/window')
+def api_window():
+    """Stats of one telemetry field over the last ``seconds`` in memory.
+
+    Mean, spread, min/max and percentiles from the ring buffer; ``.power``
+    fields also get ``energy_wh``.
+    """
+    if _ring is None:
+        return jsonify({'error': 'numpy not available'}), 503
+    field = request.args.get('field', '')
+    if field not in ring.FIELDS:
+        return jsonify({'error': 'unknown field'}), 400
+    seconds = request.args.get('seconds', 60, type=float)
+    return jsonify(_ring.stats(field, seconds))
+
+
+@app.get('/api/energy')
+def api_energy():
+    """Wh per rail for the session, the last hours and days, and in total."""
+    return jsonify(_energy.totals())
+
+
+@app.post('/api/energy/reset')
+def api_energy_reset():
+    """Start a new session; hourly, daily and total counters are kept."""
+    _energy.reset_session()
+    return jsonify(_energy.totals()['session'])
+
+
+def _command_response(res):
+    """Command result as JSON; 504 on timeout, 503 without reader or Teensy,
+    409 if the firmware debounced a relay change."""
+    if res.get('ok'):
+        return jsonify(res)
+    error = res.get('error', '')
+    if error == 'timeout':
+        return jsonify(res), 504
+    if error.startswith(('reader', 'Teensy', 'serial', 'write')):
+        return jsonify(res), 503
+    if error.startswith('relay busy'):
+        return jsonify(res), 409
+    return jsonify(res), 400
+
+
+@app.get('/api/ping')
+def api_ping():
+    """Round trip to the Teensy; ``value`` is its ``millis()``."""
+    return _command_response(_commands.ping())
+
+
+@app.post('/api/relay')
+def api_relay():
+    """Switch ``relay`` 1 or 2 ``on``/off; ``value`` is the new state.
+
+    The firmware's own overcurrent rule still switches relay 1 off.
+    """
+    data = request.get_json() or {}
+    try:
+        relay = int(data.get('relay', 0))
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error='relay must be 1 or 2'), 400
+    return _command_response(_commands.set_relay(relay, bool(data.get('on'))))
+
+
+@app.post('/api/poll-interval')
+def api_poll_interval():
+    """Set the Teensy's sensor poll / telemetry period in ms."""
+    data = request.get_json() or {}
+    try:
+        interval = int(data.get('interval_ms'))
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error='interval_ms required'), 400
+    return _command_response(_commands.set_poll_interval(interval))
+
+
+@app.before_request
+def _request_start():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _request_done(response):
+    # streams stay open; their setup time says nothing
+    if response.mimetype != 'text/event-stream' and 'started' in g:
+        rule = request.url_rule.rule if request.url_rule else 'other'
+        metrics.histogram('http_request_seconds', 'Flask handler time',
+                          path=rule).observe(time.perf_counter() - g.started)
+    return response
+
+
+@app.get('/metrics')
+def metrics_endpoint():
+    """All workers' counters and histograms in the Prometheus text format."""
+    return Response(metrics.render('flask'), mimetype='text/plain; version=0.0.4')
+
+
+@app.get('/api/drivers')
+def api_drivers():
+    """Hardware drivers this process has loaded, see ``drivers.py``."""
+    return jsonify(drivers.report())
+
+
+@app.get('/api/alerts')
+def api_alerts():
+    """Active alerts and the last fired / cleared events, see ``alerts.py``."""
+    return jsonify(_alerts.status())
+
+
+@app.get('/api/stream')
+def api_stream():
+    """Push live data as Server-Sent Events.
+
+    ``events`` is a comma separated subset of ``teency`` (every frame),
+    ``sensors`` and ``pi`` (1 Hz) and ``alerts`` (on change); ``interval``
+    caps the rate in ms.
+    With ``delta=1`` the ``teency`` events are deltas, see ``delta.py``.
+    Beyond ``serving.MAX_STREAMS`` open streams the answer is 503 and the
+    client falls back to polling, so streams cannot starve REST requests.
+    """
+    if _hub.clients >= serving.MAX_STREAMS:
+        return Response('too many streams, poll instead\n', status=503,
+                        mimetype='text/plain', headers={'Retry-After': '30'})
+    events = request.args.get('events', 'teency').split(',')
+    interval = request.args.get('interval', 0, type=int) / 1000
+    encoders = {}
+    if request.args.get('delta'):
+        cursor = DeltaCursor(_delta)
+
+        def encode(_):
+            d = cursor.next(get_teency_data())
+            return json.dumps(d, separators=(',', ':')) if d else None
+        encoders['teency'] = encode
+    return Response(
+        _hub.stream(events, interval, encoders),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+def _stop(signum, frame):
+    raise SystemExit
 
 def run(q):
-    threading.Thread(target=_listener, args=(q,), daemon=True).start()
-    app.run(host="0.0.0.0", port=8000, debug=False)
+    global _store
+    _fresh_state()
+    _store = FrameStore.attach()
+    set_source(lambda: _store.read()[2] if _store is not None else _teency)  # reactive LEDs
+    if q is not None:
+        watch(q)
+        _warm_start()
+        threading.Thread(target=_listener, args=(q,), daemon=True).start()
+    threading.Thread(target=_sampler, daemon=True).start()
+    pi_sampler()            # Pi telemetry, sampled in the background
+    _sensors.start()
+    signal.signal(signal.SIGTERM, _stop)
+    drivers.ready("flask")
+    try:
+        serving.serve(app)
+    finally:
+        _energy.save()
 
 
 if __name__ == '__main__':
-    from multiprocessing import Queue
-    run(Queue())
+    run(TelemetryBus().subscribe("flask"))
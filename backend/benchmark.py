@@ -0,0 +1,348 @@
+"""Benchmarks of the telemetry pipeline and the web API.
+
+    python -m backend.benchmark                  # all cases, bench/<time>.json
+    python -m backend.benchmark parse http --out new.json --compare old.json
+
+Cases:
+
+``parse``   ``protocol.Decoder`` frames/s for JSON lines and binary frames
+``fanout``  ``TelemetryBus`` publish -> subscriber latency with one process
+            per subscriber, as in ``main.py``
+``logger``  frames/s through the logger's work: compressed ``TelemetryLog``
+            + ``HistoryStore``; bytes written per frame
+``http``    requests/s and latency of ``/api/teency`` and ``/api/sensors``
+            with concurrent keep-alive clients
+``memory``  RSS of every ``main.py`` worker module after import, or of the
+            workers of a running ``main.py`` with ``--pid``
+``startup`` import time of every worker module in a fresh interpreter and
+            the hardware drivers the import loaded (none: they are lazy)
+
+Results are one JSON document with the git revision, so runs of two versions
+can be compared with ``--compare``.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Pipe, Process
+from typing import Any, Callable, Dict, List, Optional
+
+from .protocol import Decoder, encode_telemetry
+from .simulator import synthetic
+
+OUT_DIR = "bench"
+FRAMES = 20_000
+FANOUT_SUBSCRIBERS = 2
+HTTP_CLIENTS = (1, 8, 32)
+HTTP_SECONDS = 3.0
+
+# higher is better for these keys, lower for every other number
+_HIGHER = ("per_s", "rps")
+_NOISY = ("max_ms",)     # not compared
+
+
+def _frames(n: int) -> List[Dict[str, Any]]:
+    gen = synthetic(100.0)
+    return [next(gen)[1] for _ in range(n)]
+
+
+def _pct(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def _latency(values_s: List[float]) -> Dict[str, float]:
+    ms = [v * 1000 for v in values_s]
+    return {"p50_ms": round(_pct(ms, 50), 3), "p99_ms": round(_pct(ms, 99), 3),
+            "max_ms": round(max(ms, default=0.0), 3)}
+
+
+# -- cases ---------------------------------------------------------------
+def bench_parse() -> Dict[str, Any]:
+    pkts = _frames(FRAMES)
+    out = {}
+    for fmt, data in (
+        ("json", b"".join(json.dumps(p).encode() + b"\n" for p in pkts)),
+        ("binary", b"".join(encode_telemetry(p) for p in pkts)),
+    ):
+        dec = Decoder()
+        start = time.perf_counter()
+        n = 0
+        for i in range(0, len(data), 4096):          # USB sized chunks
+            n += len(dec.feed(data[i:i + 4096]))
+        dt = time.perf_counter() - start
+        out[fmt] = {"frames": n, "frames_per_s": round(n / dt), "errors": dec.errors}
+    return out
+
+
+def _subscriber(conn, results) -> None:
+    from .bus import receive
+    lat = []
+    while True:
+        pkts = receive(conn, 2.0)
+        if not pkts:
+            break
+        now = time.monotonic()
+        lat += [now - p["sent"] for p in pkts]
+        if pkts[-1].get("last"):
+            break
+    results.send(lat)
+
+
+def bench_fanout() -> Dict[str, Any]:
+    from .bus import TelemetryBus
+    bus = TelemetryBus()
+    procs, results = [], []
+    for i in range(FANOUT_SUBSCRIBERS):
+        conn = bus.subscribe(f"sub{i}")
+        recv, send = Pipe(duplex=False)
+        p = Process(target=_subscriber, args=(conn, send), daemon=True)
+        p.start()
+        procs.append(p)
+        results.append(recv)
+    pkts = _frames(1000)
+    n = 0
+    start = time.perf_counter()
+    deadline = time.monotonic() + 2.0
+    while time.monotonic() < deadline:
+        batch = pkts[n % 1000:n % 1000 + 10]       # reader-sized batches
+        for p in batch:
+            p["sent"] = time.monotonic()
+        bus.publish(batch)
+        n += len(batch)
+        time.sleep(0.001)
+    bus.publish([{"sent": time.monotonic(), "last": True}])
+    dt = time.perf_counter() - start
+    lat = [x for r in results for x in r.recv()]
+    for p in procs:
+        p.join()
+    return {"subscribers": FANOUT_SUBSCRIBERS, "published": n,
+            "frames_per_s": round(n / dt), "dropped": sum(bus.dropped.values()),
+            **_latency(lat)}
+
+
+def bench_logger() -> Dict[str, Any]:
+    from .history import HistoryStore
+    from .telemetry_log import TelemetryLog
+    pkts = _frames(FRAMES)
+    now = time.time()
+    for i, p in enumerate(pkts):
+        p["rx"] = now - FRAMES / 100 + i / 100
+    with tempfile.TemporaryDirectory() as tmp:
+        tlog = TelemetryLog(os.path.join(tmp, "telemetry.log"))
+        store = HistoryStore(os.path.join(tmp, "telemetry.db"))
+        start = time.perf_counter()
+        for i in range(0, FRAMES, 10):
+            batch = pkts[i:i + 10]
+            tlog.write(batch)
+            store.add(batch)
+        tlog.close()
+        store.close()
+        dt = time.perf_counter() - start
+        sizes = {f: os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)}
+        size = sum(sizes.values())
+        log_size = sum(n for f, n in sizes.items() if f.startswith("telemetry.log"))
+    return {"frames": FRAMES, "frames_per_s": round(FRAMES / dt),
+            "bytes_per_frame": round(size / FRAMES),
+            "log_bytes_per_frame": round(log_size / FRAMES, 1), "codec": tlog.codec}
+
+
+def _serve():
+    """The Flask app on a free port in this process; returns (port, stop).
+
+    Same server as ``app.run``: waitress if installed, else Werkzeug.
+    """
+    from . import app as webapp
+    from . import serving
+    webapp._fresh_state()
+    webapp._teency = _frames(1)[0]
+    server = serving.create_server(webapp.app, "127.0.0.1", 0)
+    if server is not None:
+        threading.Thread(target=server.run, daemon=True).start()
+        return server.effective_port, server.close
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def _client(port: int, path: str, until: float, lat: List[float]) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    while time.monotonic() < until:
+        start = time.perf_counter()
+        conn.request("GET", path)
+        conn.getresponse().read()
+        lat.append(time.perf_counter() - start)
+    conn.close()
+
+
+def _clients(port: int, path: str, clients: int, results) -> None:
+    """``clients`` keep-alive connections in their own process (own GIL)."""
+    lats: List[List[float]] = [[] for _ in range(clients)]
+    until = time.monotonic() + HTTP_SECONDS
+    threads = [threading.Thread(target=_client, args=(port, path, until, l)) for l in lats]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.send([x for l in lats for x in l])
+
+
+def bench_http() -> Dict[str, Any]:
+    port, stop = _serve()
+    out = {}
+    try:
+        for path in ("/api/teency", "/api/sensors"):
+            for clients in HTTP_CLIENTS:
+                recv, send = Pipe(duplex=False)
+                p = Process(target=_clients, args=(port, path, clients, send), daemon=True)
+                p.start()
+                lat = recv.recv()
+                p.join()
+                out[f"{path} x{clients}"] = {"rps": round(len(lat) / HTTP_SECONDS),
+                                             **_latency(lat)}
+    finally:
+        stop()
+    return out
+
+
+def _rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def bench_memory(pid: Optional[int] = None) -> Dict[str, Any]:
+    if pid:
+        out = {"main": _rss_kb(pid)}
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                with open(f"/proc/{child}/cmdline", "rb") as c:
+                    name = c.read().replace(b"\0", b" ").decode().strip()
+                out[f"{child} {name}"] = _rss_kb(int(child))
+        return {"rss_kb": out}
+    import main as topology
+    out = {}
+    for name, mod in topology.workers.items():
+        code = (f"import importlib; importlib.import_module({mod!r});"
+                "print(open('/proc/self/status').read())")
+        res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        rss = [l for l in res.stdout.splitlines() if l.startswith("VmRSS:")]
+        out[name] = int(rss[0].split()[1]) if rss else None
+    return {"import_rss_kb": out}
+
+
+def bench_startup() -> Dict[str, Any]:
+    import main as topology
+    out = {}
+    for name, mod in topology.workers.items():
+        code = ("import importlib, json, time; t = time.perf_counter();"
+                f"importlib.import_module({mod!r}); dt = time.perf_counter() - t;"
+                "from backend import drivers;"
+                "print(json.dumps({'import_ms': round(dt * 1000, 1),"
+                " 'drivers': sorted(drivers.report())}))")
+        res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        try:
+            out[name] = json.loads(res.stdout.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            out[name] = {"error": (res.stderr.strip().splitlines() or ["failed"])[-1]}
+    return out
+
+
+CASES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "parse": bench_parse,
+    "fanout": bench_fanout,
+    "logger": bench_logger,
+    "http": bench_http,
+    "memory": bench_memory,
+    "startup": bench_startup,
+}
+
+
+# -- reporting -----------------------------------------------------------
+def _meta() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": rev,
+            "python": platform.python_version(), "machine": platform.machine(),
+            "host": platform.node()}
+
+
+def _flat(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flat(v, f"{prefix}{k}/"))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[prefix + k] = v
+    return out
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """Lines for every metric that got worse by more than ``tolerance``."""
+    a, b = _flat(old["results"]), _flat(new["results"])
+    worse = []
+    for key in sorted(a.keys() & b.keys()):
+        if not a[key] or key.endswith(_NOISY):
+            continue
+        ratio = b[key] / a[key]
+        higher = key.rsplit("/", 1)[-1].endswith(_HIGHER)
+        if (ratio < 1 - tolerance) if higher else (ratio > 1 + tolerance):
+            worse.append(f"{key}: {a[key]} -> {b[key]}")
+    return worse
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("cases", nargs="*", metavar="case",
+                    help=f"any of {', '.join(CASES)}; all by default")
+    ap.add_argument("--out", help=f"result file, default {OUT_DIR}/<time>.json")
+    ap.add_argument("--compare", metavar="OLD", help="exit 1 if worse than this result")
+    ap.add_argument("--pid", type=int, help="main.py pid for the memory case")
+    args = ap.parse_args(argv)
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        ap.error(f"unknown case {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.cases or CASES:
+        print(f"{name} ...", file=sys.stderr, flush=True)
+        kwargs = {"pid": args.pid} if name == "memory" else {}
+        results[name] = CASES[name](**kwargs)
+    doc = {"meta": _meta(), "results": results}
+    out = args.out
+    if not out:
+        os.makedirs(OUT_DIR, exist_ok=True)
+        out = os.path.join(OUT_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(out, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"written to {out}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            worse = compare(json.load(f), doc)
+        for line in worse:
+            print("worse:", line, file=sys.stderr)
+        return 1 if worse else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Commands to the Teensy over the telemetry serial link.
+
+The reader owns the port, so it also owns the sending side: a ``Dispatcher``
+numbers every command, writes it under one lock and matches the acks it
+decodes from the same stream.  Commands are pipelined; each one fails on
+its own after ``timeout``.  Other processes reach the dispatcher through a
+Unix socket (``serve``) with ``CommandClient``::
+
+    client = CommandClient()
+    client.set_relay(1, True)    # {"ok": True, "value": 1, "rtt_ms": 2.1}
+
+Requests and replies on the socket are JSON lines
+``{"id", "cmd", "args", "timeout"}`` and ``{"id", "ok", ...}``.
+"""
+
+import functools
+import itertools
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+from .protocol import (ACK_BAD_ARGS, ACK_BAD_COMMAND, ACK_BUSY, ACK_OK, CMD_PING,
+                       CMD_SET_POLL, CMD_SET_RELAY, encode_command)
+
+log = logging.getLogger(__name__)
+
+SOCKET = os.environ.get("TEENSY_COMMAND_SOCKET", "/dev/shm/burning-control-cmd.sock")
+TIMEOUT = 0.5            # s for the ack of one command
+POLL_RANGE = (5, 60000)  # ms the firmware accepts
+
+
+def _relay(relay: int, on: bool) -> bytes:
+    if relay not in (1, 2):
+        raise ValueError("relay must be 1 or 2")
+    return struct.pack("<BB", relay, bool(on))
+
+
+def _poll(interval_ms: int) -> bytes:
+    if not POLL_RANGE[0] <= int(interval_ms) <= POLL_RANGE[1]:
+        raise ValueError(f"interval_ms must be {POLL_RANGE[0]}..{POLL_RANGE[1]}")
+    return struct.pack("<H", int(interval_ms))
+
+
+# name -> (op, args -> bytes)
+COMMANDS: Dict[str, tuple] = {
+    "ping": (CMD_PING, lambda: b""),
+    "relay": (CMD_SET_RELAY, _relay),
+    "poll": (CMD_SET_POLL, _poll),
+}
+_STATUS = {ACK_BAD_COMMAND: "unknown command", ACK_BAD_ARGS: "bad arguments",
+           ACK_BUSY: "relay busy, retry"}
+
+_rtt = metrics.histogram("command_rtt_seconds", "Command write to ack")
+_timeouts = metrics.counter("command_timeouts_total", "Commands without an ack in time")
+_late = metrics.counter("command_late_acks_total", "Acks for unknown or expired commands")
+
+Done = Callable[[Dict[str, Any]], None]
+
+
+class Dispatcher:
+    """Writes commands to the reader's serial port and matches their acks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ser = None
+        self._seq = 0
+        self._pending: Dict[int, tuple] = {}    # seq -> (sent, deadline, done)
+
+    def attach(self, ser) -> None:
+        """Port (re)opened, or closed with ``None``: open commands fail."""
+        with self._lock:
+            self._ser = ser
+            failed, self._pending = list(self._pending.values()), {}
+        for _, _, done in failed:
+            done({"ok": False, "error": "serial port reset"})
+
+    def submit(self, name: str, args: Dict[str, Any], done: Done,
+               timeout: float = TIMEOUT) -> None:
+        """Send one command; ``done`` gets the result from the reader thread."""
+        try:
+            op, pack = COMMANDS[name]
+            body = pack(**args)
+        except KeyError:
+            return done({"ok": False, "error": f"unknown command {name!r}"})
+        except (TypeError, ValueError) as e:
+            return done({"ok": False, "error": str(e)})
+        metrics.counter("commands_total", "Commands sent to the Teensy", cmd=name).inc()
+        with self._lock:
+            if self._ser is None:
+                return done({"ok": False, "error": "Teensy not connected"})
+            self._seq = seq = (self._seq + 1) & 0xFFFF
+            stale = self._pending.pop(seq, None)
+            try:
+                self._ser.write(encode_command(seq, op, body))
+            except Exception as e:
+                return done({"ok": False, "error": f"write failed: {e}"})
+            self._pending[seq] = (time.perf_counter(), time.monotonic() + timeout, done)
+        if stale is not None:       # 65536 commands in flight: cannot happen
+            stale[2]({"ok": False, "error": "timeout"})
+
+    def on_ack(self, pkt: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._pending.pop(pkt["seq"], None)
+        if entry is None:
+            _late.inc()
+            return
+        sent, _, done = entry
+        rtt = time.perf_counter() - sent
+        _rtt.observe(rtt)
+        status = pkt["status"]
+        res = {"ok": status == ACK_OK, "value": pkt["value"], "rtt_ms": round(rtt * 1000, 3)}
+        if status != ACK_OK:
+            res["error"] = _STATUS.get(status, f"status {status}")
+        done(res)
+
+    def expire(self) -> None:
+        """Fail commands past their deadline; called from the read loop."""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        with self._lock:
+            late = [seq for seq, (_, deadline, _) in self._pending.items() if deadline <= now]
+            expired = [self._pending.pop(seq) for seq in late]
+        for _, _, done in expired:
+            _timeouts.inc()
+            done({"ok": False, "error": "timeout"})
+
+
+# -- socket between the reader and other processes -------------------------
+def serve(dispatcher: Dispatcher, path: Optional[str] = None) -> None:
+    """Accept ``CommandClient`` connections in daemon threads."""
+    path = path or SOCKET
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        sock.listen()
+    except OSError as e:
+        log.warning("no command socket at %s: %s", path, e)
+        sock.close()
+        return
+
+    def accept():
+        while True:
+            conn, _ = sock.accept()
+            threading.Thread(target=_session, args=(dispatcher, conn),
+                             daemon=True, name="commands").start()
+
+    threading.Thread(target=accept, daemon=True, name="commands").start()
+
+
+def _session(dispatcher: Dispatcher, conn: socket.socket) -> None:
+    lock = threading.Lock()
+
+    def reply(msg_id, res):
+        with lock:
+            try:
+                conn.sendall(json.dumps({"id": msg_id, **res}).encode() + b"\n")
+            except OSError:
+                pass
+
+    with conn, conn.makefile("rb") as f:
+        for line in f:
+            try:
+                req = json.loads(line)
+                done = functools.partial(reply, req.get("id"))
+                dispatcher.submit(req.get("cmd"), req.get("args") or {}, done,
+                                  float(req.get("timeout") or TIMEOUT))
+            except (ValueError, AttributeError) as e:
+                log.warning("bad command request: %s", e)
+
+
+class CommandClient:
+    """Thread-safe client of the reader's command socket.
+
+    One connection, opened on first use; concurrent calls are pipelined and
+    matched to their replies by id.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or SOCKET
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, dict] = {}
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        threading.Thread(target=self._read, args=(sock,), daemon=True,
+                         name="command-client").start()
+        return sock
+
+    def _read(self, sock: socket.socket) -> None:
+        with sock.makefile("rb") as f:
+            for line in f:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                slot = self._waiting.pop(msg.pop("id", None), None)
+                if slot is not None:
+                    slot["result"] = msg
+                    slot["event"].set()
+        with self._lock:            # reader restarted: reconnect on next call
+            if self._sock is sock:
+                self._sock = None
+        for msg_id in list(self._waiting):
+            slot = self._waiting.pop(msg_id, None)
+            if slot is not None:
+                slot["event"].set()
+
+    def call(self, cmd: str, timeout: float = TIMEOUT, **args) -> Dict[str, Any]:
+        slot = {"event": threading.Event(),
+                "result": {"ok": False, "error": "reader disconnected"}}
+        msg_id = next(self._ids)
+        line = json.dumps({"id": msg_id, "cmd": cmd, "args": args,
+                           "timeout": timeout}).encode() + b"\n"
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = self._connect()
+                self._waiting[msg_id] = slot
+                self._sock.sendall(line)
+            except OSError as e:
+                self._waiting.pop(msg_id, None)
+                self._sock = None
+                return {"ok": False, "error": f"reader not reachable: {e}"}
+        if not slot["event"].wait(timeout + 1.0):
+            self._waiting.pop(msg_id, None)
+            return {"ok": False, "error": "timeout"}
+        return slot["result"]
+
+    def ping(self) -> Dict[str, Any]:
+        return self.call("ping")
+
+    def set_relay(self, relay: int, on: bool) -> Dict[str, Any]:
+        return self.call("relay", relay=relay, on=bool(on))
+
+    def set_poll_interval(self, interval_ms: int) -> Dict[str, Any]:
+        return self.call("poll", interval_ms=interval_ms)
@@ -0,0 +1,117 @@
+"""Versioned delta encoding of telemetry snapshots.
+
+A client keeps ``epoch`` and ``seq`` from the last message and sends them
+back; the answer only carries fields that changed since then, by more than
+their deadband.  Messages look like::
+
+    {"v": 1, "epoch": 1718000000, "seq": 42, "full": false,
+     "set": {"voltageSensorV24.current": 0.31}, "del": [],
+     "meta": {"ts": 123450, "rx": 1718000123.4}}
+
+The per-frame stamps in ``META`` are not fields: they change with every
+frame, so they never count as a change and only ride along in ``meta``.
+
+``full`` replaces the client's state.  It is sent to new clients, after a
+server restart (new ``epoch``) and to clients more than ``MAX_LAG`` behind.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+VERSION = 1
+MAX_LAG = 600
+META = ("ts", "rx")     # stamps of the newest frame, sent with every message
+
+# by leaf key; changes up to the deadband are not reported
+DEADBANDS = {
+    "current": 0.002,
+    "voltage": 0.005,
+    "power": 0.01,
+    "temperature": 0.1,
+    "humidity": 0.1,
+}
+
+
+_MISSING = object()
+
+
+def flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{prefix}{k}."))
+        else:
+            out[prefix + k] = v
+    return out
+
+
+def _band(field: str) -> float:
+    return DEADBANDS.get(field.rsplit(".", 1)[-1], 0.0)
+
+
+class DeltaState:
+    """Last reported value and change ``seq`` of every field."""
+
+    def __init__(self):
+        self.epoch = int(time.time())
+        self.seq = 0
+        self._values: Dict[str, Any] = {}
+        self._changed: Dict[str, int] = {}   # field -> seq, also for removed ones
+        self.meta: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def update(self, snapshot: Dict[str, Any]) -> None:
+        flat = flatten(snapshot)
+        meta = {k: flat.pop(k) for k in META if k in flat}
+        with self._lock:
+            self.meta = meta
+            seq = self.seq + 1
+            values, changed = self._values, self._changed
+            dirty = False
+            for k, v in flat.items():
+                old = values.get(k, _MISSING)
+                if old is v or old == v:
+                    continue
+                if (type(v) is float and type(old) is float
+                        and abs(v - old) <= _band(k)):
+                    continue
+                values[k] = v
+                changed[k] = seq
+                dirty = True
+            for k in [k for k in values if k not in flat]:
+                del values[k]
+                changed[k] = seq
+                dirty = True
+            if dirty:
+                self.seq = seq
+
+    def delta(self, since: Optional[int] = None, epoch: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            full = (since is None or epoch != self.epoch
+                    or since > self.seq or self.seq - since > MAX_LAG)
+            if full:
+                put, drop = dict(self._values), []
+            else:
+                fresh = [k for k, s in self._changed.items() if s > since]
+                put = {k: self._values[k] for k in fresh if k in self._values}
+                drop = [k for k in fresh if k not in self._values]
+            return {"v": VERSION, "epoch": self.epoch, "seq": self.seq,
+                    "full": full, "set": put, "del": drop, "meta": self.meta}
+
+
+class DeltaCursor:
+    """One streaming client's position in a ``DeltaState``."""
+
+    def __init__(self, state: DeltaState):
+        self.state = state
+        self.epoch = self.seq = None
+
+    def next(self, snapshot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Delta after applying ``snapshot`` or ``None`` if nothing changed."""
+        self.state.update(snapshot)
+        d = self.state.delta(self.seq, self.epoch)
+        if not (d["full"] or d["set"] or d["del"]):
+            return None
+        self.epoch, self.seq = d["epoch"], d["seq"]
+        return d
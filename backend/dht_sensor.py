@@ -2,12 +2,7 @@
 
 import logging
 
-try:  # pragma: no cover - hardware optional
-    import board
-    import adafruit_dht
-except Exception as e:  # pragma: no cover - no hardware in tests
-    board = adafruit_dht = None
-    logging.error("DHT11 libs not available: %s", e)
+from . import drivers
 
 log = logging.getLogger(__name__)
 
@@ -15,15 +10,17 @@ log = logging.getLogger(__name__)
 class DHT11Sensor:
     """Wrapper for a single DHT11 sensor."""
 
-    def __init__(self, pin=board.D4):
-        self.pin = pin
+    def __init__(self, pin="D4"):
+        self.pin = pin          # board pin or its name
         self._sensor = None
 
     def _init_sensor(self):
-        if board is None or adafruit_dht is None:
+        adafruit_dht = drivers.get("dht")
+        pin = drivers.pin(self.pin) if isinstance(self.pin, str) else self.pin
+        if adafruit_dht is None or pin is None:
             return
         try:
-            self._sensor = adafruit_dht.DHT11(self.pin)
+            self._sensor = adafruit_dht.DHT11(pin)
             log.info("DHT11 on %s initialized", self.pin)
         except Exception as e:  # pragma: no cover - hardware error
             log.info("DHT11 init failed: %s", e)
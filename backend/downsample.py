@@ -0,0 +1,57 @@
+"""Server-side decimation of time series for charts."""
+
+from typing import List, Sequence, Tuple
+
+
+def lttb(t: Sequence[float], v: Sequence[float], n: int) -> Tuple[List[float], List[float]]:
+    """Largest-Triangle-Three-Buckets: ``n`` points that keep the visual shape."""
+    size = len(t)
+    if n >= size:
+        return list(t), list(v)
+    if n < 3:                   # no bucket in between: the end points
+        keep = [0, size - 1][:max(n, 0)]
+        return [t[i] for i in keep], [v[i] for i in keep]
+    out_t, out_v = [t[0]], [v[0]]
+    every = (size - 2) / (n - 2)
+    a = 0
+    for i in range(n - 2):
+        # average of the next bucket is the third triangle corner
+        lo = int((i + 1) * every) + 1
+        hi = min(int((i + 2) * every) + 1, size)
+        avg_t = sum(t[lo:hi]) / (hi - lo)
+        avg_v = sum(v[lo:hi]) / (hi - lo)
+        start = int(i * every) + 1
+        end = lo
+        at, av = t[a], v[a]
+        best, area = start, -1.0
+        for j in range(start, end):
+            s = abs((at - avg_t) * (v[j] - av) - (at - t[j]) * (avg_v - av))
+            if s > area:
+                best, area = j, s
+        out_t.append(t[best])
+        out_v.append(v[best])
+        a = best
+    out_t.append(t[-1])
+    out_v.append(v[-1])
+    return out_t, out_v
+
+
+def minmax(t: Sequence[float], lo: Sequence[float], hi: Sequence[float], n: int):
+    """Merge into ``n`` buckets keeping each bucket's extremes.
+
+    Returns ``(t, min, max)`` with ``t`` the start of every bucket; pass the
+    same sequence as ``lo`` and ``hi`` for raw samples.
+    """
+    size = len(t)
+    if n >= size or n < 1:
+        return list(t), list(lo), list(hi)
+    out_t, out_lo, out_hi = [], [], []
+    every = size / n
+    for i in range(n):
+        a, b = int(i * every), int((i + 1) * every)
+        if a == b:
+            continue
+        out_t.append(t[a])
+        out_lo.append(min(lo[a:b]))
+        out_hi.append(max(hi[a:b]))
+    return out_t, out_lo, out_hi
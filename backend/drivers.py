@@ -0,0 +1,85 @@
+"""Hardware driver registry: Blinka, sensor and display libraries, imported
+on first use.
+
+Workers that never touch a device don't pay for the imports, and a missing
+or broken library only disables the feature that needs it::
+
+    neopixel = drivers.get("neopixel")     # the module, or None
+    pin = drivers.pin("D18")               # board.D18, or None
+
+Import times and failures are logged once and exported as metrics;
+``report()`` lists them.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# name -> module
+DRIVERS = {
+    "board": "board",
+    "busio": "busio",
+    "neopixel": "neopixel",
+    "dht": "adafruit_dht",
+    "ahtx0": "adafruit_ahtx0",
+    "ssd1306": "adafruit_ssd1306",
+    "gpiozero": "gpiozero",
+    "pil_font": "PIL.ImageFont",
+}
+
+_modules: Dict[str, Any] = {}
+_errors: Dict[str, str] = {}
+_times: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def get(name: str):
+    """The driver module, imported now if needed; ``None`` if unavailable."""
+    if name in _modules:
+        return _modules[name]
+    with _lock:
+        if name not in _modules:
+            start = time.perf_counter()
+            try:
+                mod = importlib.import_module(DRIVERS[name])
+            except Exception as e:      # ImportError, or Blinka on an unknown board
+                mod = None
+                _errors[name] = str(e)
+                log.warning("driver %s unavailable: %s", name, e)
+            _times[name] = time.perf_counter() - start
+            metrics.gauge("driver_import_seconds", "Driver import time",
+                          driver=name).set(_times[name])
+            metrics.gauge("driver_available", "1 if the driver imported",
+                          driver=name).set(0 if mod is None else 1)
+            _modules[name] = mod
+    return _modules[name]
+
+
+def pin(name: str):
+    """``board.<name>``, or ``None`` without Blinka."""
+    board = get("board")
+    return getattr(board, name, None) if board is not None else None
+
+
+def report() -> Dict[str, Dict[str, Any]]:
+    """Drivers loaded so far with import time and error."""
+    return {name: {"available": _modules[name] is not None,
+                   "import_ms": round(_times[name] * 1000, 1),
+                   "error": _errors.get(name)}
+            for name in list(_modules)}
+
+
+def ready(worker: str) -> float:
+    """Log and export how long this worker took from process start to ready."""
+    age = metrics.process_age()
+    metrics.gauge("worker_startup_seconds", "Process start to ready").set(age)
+    loaded = ", ".join(f"{n} {r['import_ms']} ms" + ("" if r["available"] else " (missing)")
+                       for n, r in report().items())
+    log.info("%s ready after %.2f s; drivers: %s", worker, age, loaded or "none")
+    return age
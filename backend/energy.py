@@ -0,0 +1,177 @@
+"""Energy accounting per INA219 rail.
+
+``power`` of every ``frame.VOLTAGE_SENSORS`` rail is integrated with the
+trapezoid rule over the Teensy ``ts``, so USB batching on the host does not
+skew dt; frames without ``ts`` (old firmware, legacy logs) use the host
+``rx`` instead.  Wh are kept for the session (until reset), per hour, per day and in
+total, and saved to ``energy.json`` so they survive restarts.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .frame import VOLTAGE_SENSORS as RAILS
+
+log = logging.getLogger(__name__)
+
+STATE_PATH = "energy.json"
+SAVE_INTERVAL = 10.0     # s between state writes
+MAX_GAP = 1.0            # s; longer gaps (reboot, dropout) add no energy
+KEEP_HOURS = 7 * 24
+KEEP_DAYS = 400
+
+
+def _zeros() -> List[float]:
+    return [0.0] * len(RAILS)
+
+
+def _day(t: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(t))
+
+
+def _by_rail(wh: List[float]) -> Dict[str, float]:
+    return dict(zip(RAILS, (round(x, 4) for x in wh)))
+
+
+class EnergyMeter:
+    def __init__(self, path: Optional[str] = STATE_PATH):
+        self.path = path
+        self.session_start = time.time()
+        self.session = _zeros()
+        self.total = _zeros()
+        self.hours: Dict[int, List[float]] = {}   # hour start (epoch s) -> Wh
+        self.days: Dict[str, List[float]] = {}    # local date -> Wh
+        self._pending = _zeros()                  # Wh not yet in the above
+        self._hour = self._next_hour = 0
+        self._day = ""
+        self._ts: Optional[int] = None
+        self._rx: Optional[float] = None
+        self._power = _zeros()
+        self._on = [False] * len(RAILS)
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    # -- integrating -----------------------------------------------------
+    def add(self, pkts: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            for pkt in pkts:
+                self._add(pkt)
+
+    def _add(self, pkt: Dict[str, Any]) -> None:
+        ts = pkt.get("ts")
+        rx = pkt.get("rx") or time.time()
+        if rx >= self._next_hour:
+            self._roll(rx)
+        if ts is not None:
+            dt = ((ts - self._ts) & 0xFFFFFFFF) / 1000.0 if self._ts is not None else 0.0
+        else:
+            dt = rx - self._rx if self._rx is not None else 0.0
+        self._ts, self._rx = ts, rx
+        if not 0.0 < dt <= MAX_GAP:
+            dt = 0.0
+        for i, rail in enumerate(RAILS):
+            s = pkt.get(rail) or {}
+            p, on = s.get("power") or 0.0, bool(s.get("isAvailable"))
+            if dt and on and self._on[i]:
+                self._pending[i] += (p + self._power[i]) * dt / 7200.0
+            self._power[i], self._on[i] = p, on
+
+    def _roll(self, t: float) -> None:
+        """Book pending Wh and move to the hour of ``t``."""
+        self._book()
+        self._hour = int(t // 3600) * 3600
+        self._next_hour = self._hour + 3600
+        self._day = _day(t)
+
+    def _book(self) -> None:
+        if not any(self._pending):
+            return
+        hour = self.hours.setdefault(self._hour, _zeros())
+        day = self.days.setdefault(self._day, _zeros())
+        for acc in (self.session, self.total, hour, day):
+            for i, wh in enumerate(self._pending):
+                acc[i] += wh
+        self._pending = _zeros()
+
+    def reset_session(self) -> None:
+        with self._lock:
+            self._book()
+            self.session = _zeros()
+            self.session_start = time.time()
+
+    # -- reporting -------------------------------------------------------
+    def totals(self) -> Dict[str, Any]:
+        """Wh per rail.
+
+        ``drift`` is the last full hour over the mean of up to 24 hours
+        before it, 1.0 meaning unchanged consumption.
+        """
+        with self._lock:
+            self._book()
+            hours = sorted(self.hours)
+            done = [h for h in hours if h < self._hour]
+            drift = {}
+            if len(done) >= 2:
+                last, prev = self.hours[done[-1]], [self.hours[h] for h in done[-25:-1]]
+                for i, rail in enumerate(RAILS):
+                    base = sum(h[i] for h in prev) / len(prev)
+                    drift[rail] = round(last[i] / base, 3) if base > 0 else None
+            return {
+                "session": {"since": self.session_start, "wh": _by_rail(self.session)},
+                "total": _by_rail(self.total),
+                "power": _by_rail(self._power),
+                "hours": [{"t": h, "wh": _by_rail(self.hours[h])} for h in hours[-24:]],
+                "days": [{"day": d, "wh": _by_rail(self.days[d])}
+                         for d in sorted(self.days)[-31:]],
+                "drift": drift,
+            }
+
+    # -- persistence -----------------------------------------------------
+    def tick(self) -> None:
+        """Save when due; call it regularly."""
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        self._last_save = time.monotonic()
+        if not self.path:
+            return
+        with self._lock:
+            self._book()
+            for h in sorted(self.hours)[:-KEEP_HOURS]:
+                del self.hours[h]
+            for d in sorted(self.days)[:-KEEP_DAYS]:
+                del self.days[d]
+            state = json.dumps({"rails": RAILS, "session_start": self.session_start,
+                                "session": self.session, "total": self.total,
+                                "hours": self.hours, "days": self.days})
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(state)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log.warning("energy state not saved: %s", e)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("energy state not loaded: %s", e)
+            return
+        if list(state.get("rails", ())) != list(RAILS):
+            log.warning("energy state is for other rails, starting over")
+            return
+        self.session_start = state["session_start"]
+        self.session, self.total = state["session"], state["total"]
+        self.hours = {int(h): v for h, v in state["hours"].items()}
+        self.days = state["days"]
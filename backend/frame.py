@@ -0,0 +1,80 @@
+"""Fixed binary layout of the firmware ``Telemetry`` struct (Globals.h)."""
+
+import struct
+from typing import Any, Dict
+
+VOLTAGE_SENSORS = ("voltageSensorV3", "voltageSensorV5", "voltageSensorV5PiBrain", "voltageSensorV24")
+TEMP_SENSORS = ("temperatureSensor1", "temperatureSensor2")
+FLAGS = ("relay1", "relay2", "button")
+
+# (group, key, struct code, decimals); key is None for top level fields.
+# Decimals match what sendJson() prints, so float32 noise is rounded away.
+_LAYOUT = [("ts", None, "I", None)]
+for _s in VOLTAGE_SENSORS:
+    _LAYOUT += [(_s, "current", "f", 3), (_s, "voltage", "f", 3),
+                (_s, "power", "f", 3), (_s, "isAvailable", "?", None)]
+for _s in TEMP_SENSORS:
+    _LAYOUT += [(_s, "temperature", "f", 1), (_s, "humidity", "f", 1),
+                (_s, "isAvailable", "?", None)]
+_LAYOUT += [(f, None, "?", None) for f in FLAGS]
+
+TELEMETRY = struct.Struct("<" + "".join(code for _, _, code, _ in _LAYOUT))
+SIZE = TELEMETRY.size
+
+# dotted field names in struct order, e.g. "voltageSensorV24.current"
+FIELDS = tuple(g if k is None else f"{g}.{k}" for g, k, _, _ in _LAYOUT)
+
+# top level keys in struct order; a JSON frame may lack some, see presence()
+GROUPS = tuple(dict.fromkeys(g for g, _, _, _ in _LAYOUT))
+ALL_GROUPS = (1 << len(GROUPS)) - 1
+
+
+def values(pkt: Dict[str, Any]) -> list:
+    """Flatten a telemetry dict into struct order, missing fields as 0.
+
+    Keep ``presence(pkt)`` next to the record where absent fields must stay
+    absent instead of reading as off / 0.
+    """
+    out = []
+    for group, key, _, _ in _LAYOUT:
+        if key is None:
+            out.append(pkt.get(group) or 0)
+        else:
+            out.append((pkt.get(group) or {}).get(key) or 0)
+    return out
+
+
+def presence(pkt: Dict[str, Any]) -> int:
+    """Bitmask of the ``GROUPS`` in ``pkt``; a binary frame has all of them."""
+    return sum(1 << i for i, g in enumerate(GROUPS) if g in pkt)
+
+
+def pack(pkt: Dict[str, Any]) -> bytes:
+    return TELEMETRY.pack(*values(pkt))
+
+
+def pack_into(buf, offset: int, pkt: Dict[str, Any]) -> None:
+    TELEMETRY.pack_into(buf, offset, *values(pkt))
+
+
+def to_dict(vals) -> Dict[str, Any]:
+    """Rebuild the nested dict ``sendJson()`` produces from struct values."""
+    out: Dict[str, Any] = {}
+    for (group, key, code, decimals), v in zip(_LAYOUT, vals):
+        if decimals is not None:
+            v = round(v, decimals)
+        if key is None:
+            out[group] = v
+        else:
+            out.setdefault(group, {})[key] = v
+    return out
+
+
+def unpack(buf, offset: int = 0, present: int = ALL_GROUPS) -> Dict[str, Any]:
+    """The dict of a packed record, without the groups missing from ``present``."""
+    out = to_dict(TELEMETRY.unpack_from(buf, offset))
+    if present != ALL_GROUPS:
+        for i, g in enumerate(GROUPS):
+            if not present >> i & 1:
+                del out[g]
+    return out
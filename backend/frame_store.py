@@ -0,0 +1,175 @@
+"""Latest Teensy frame in shared memory, readable from any worker.
+
+The reader packs each frame once into a fixed record (see ``frame.py``);
+consumers copy it out under a seqlock instead of unpickling every packet
+from a queue just to keep the newest one.  Fields a JSON frame did not have
+are left out again on reading, not reported as 0 / off.
+
+``FrameHistory`` keeps the last few thousand frames the same way.  Both
+segments belong to ``main.py``, so they outlive a crashed worker and a
+restarted one starts from the frames it missed (see ``main.Supervisor``).
+"""
+
+import logging
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import frame
+
+log = logging.getLogger(__name__)
+
+SHM_NAME = "burning_control_frame"
+HISTORY_NAME = "burning_control_history"
+HISTORY_CAPACITY = 6000     # frames: 10 min at 10 Hz, 1 min at 100 Hz
+
+# seq (odd while a write is in progress), frame.presence(), host receive time
+_HEADER = struct.Struct("<IId")
+SIZE = _HEADER.size + frame.SIZE
+
+
+def _create(name: str, size: int) -> shared_memory.SharedMemory:
+    try:  # left over from a crashed run
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+    except FileNotFoundError:
+        pass
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    shm.buf[:size] = bytes(size)
+    return shm
+
+
+class FrameStore:
+    """Single-writer, multi-reader latest-value slot."""
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self._shm = shm
+        self._buf = shm.buf
+        self._seq = _HEADER.unpack_from(self._buf)[0] & ~1
+        self._cache = (0, 0.0, None)   # seq, rx, dict of the last read
+
+    @classmethod
+    def create(cls, name: str = SHM_NAME) -> "FrameStore":
+        """Create the segment; called once by ``main.py``."""
+        return cls(_create(name, SIZE))
+
+    @classmethod
+    def attach(cls, name: str = SHM_NAME) -> Optional["FrameStore"]:
+        """Open the segment created by ``main.py`` or return ``None``."""
+        try:
+            return cls(shared_memory.SharedMemory(name=name))
+        except FileNotFoundError:
+            log.info("frame store %s not found", name)
+            return None
+
+    @property
+    def seq(self) -> int:
+        return _HEADER.unpack_from(self._buf)[0]
+
+    def write(self, pkt: Dict[str, Any], rx: Optional[float] = None) -> None:
+        """Publish ``pkt`` as the latest frame. Only the reader may call this."""
+        buf = self._buf
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        _HEADER.pack_into(buf, 0, self._seq, 0, 0.0)
+        frame.pack_into(buf, _HEADER.size, pkt)
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        _HEADER.pack_into(buf, 0, self._seq, frame.presence(pkt),
+                          time.time() if rx is None else rx)
+
+    def read(self):
+        """Return ``(seq, rx, frame)`` for the newest frame.
+
+        ``frame`` is ``None`` until the reader has written anything.  The dict
+        is shared between calls with the same ``seq`` and must not be mutated.
+        """
+        buf = self._buf
+        while True:
+            seq = _HEADER.unpack_from(buf)[0]
+            if seq == self._cache[0]:
+                return self._cache
+            if seq & 1:
+                continue              # writer is mid-update
+            raw = bytes(buf[:SIZE])
+            if _HEADER.unpack_from(buf)[0] == seq:
+                break
+        _, present, rx = _HEADER.unpack_from(raw)
+        self._cache = (seq, rx, frame.unpack(raw, _HEADER.size, present))
+        return self._cache
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
+
+
+# frames written so far; record i lives in slot i % capacity
+_COUNT = struct.Struct("<Q")
+_META = struct.Struct("<dI")     # receive time, frame.presence()
+_RECORD = _META.size + frame.SIZE
+
+
+class FrameHistory:
+    """Single-writer ring of recent frames with their receive time.
+
+    The reader appends every frame; a worker reads it once at startup to
+    refill what it keeps in memory.  Readers copy the whole ring and drop
+    the slots the writer may have overwritten meanwhile.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self._shm = shm
+        self._buf = shm.buf
+        self.capacity = (shm.size - _COUNT.size) // _RECORD
+        self._count = _COUNT.unpack_from(self._buf)[0]
+
+    @classmethod
+    def create(cls, name: str = HISTORY_NAME,
+               capacity: int = HISTORY_CAPACITY) -> "FrameHistory":
+        return cls(_create(name, _COUNT.size + capacity * _RECORD))
+
+    @classmethod
+    def attach(cls, name: str = HISTORY_NAME) -> Optional["FrameHistory"]:
+        try:
+            return cls(shared_memory.SharedMemory(name=name))
+        except FileNotFoundError:
+            log.info("frame history %s not found", name)
+            return None
+
+    def append(self, pkts: Iterable[Dict[str, Any]], rx: float) -> None:
+        """Add a batch received at ``rx``. Only the reader may call this."""
+        buf, n = self._buf, self._count
+        for pkt in pkts:
+            off = _COUNT.size + (n % self.capacity) * _RECORD
+            _META.pack_into(buf, off, rx, frame.presence(pkt))
+            frame.pack_into(buf, off + _META.size, pkt)
+            n += 1
+            _COUNT.pack_into(buf, 0, n)
+        self._count = n
+
+    def frames(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Frames received after ``since`` (epoch s), oldest first, with ``rx``."""
+        buf = self._buf
+        before = _COUNT.unpack_from(buf)[0]
+        raw = bytes(buf[:_COUNT.size + self.capacity * _RECORD])
+        after = _COUNT.unpack_from(buf)[0]
+        # slots written during the copy, and the one being written, are torn
+        first = max(0, after - self.capacity + 1)
+        out = []
+        for i in range(first, before):
+            off = _COUNT.size + (i % self.capacity) * _RECORD
+            rx, present = _META.unpack_from(raw, off)
+            if rx > since:
+                out.append({"type": "telemetry", **frame.unpack(raw, off + _META.size, present),
+                            "rx": rx})
+        return out
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
@@ -0,0 +1,232 @@
+"""Telemetry history in SQLite (WAL) with 1 s / 1 min / 1 h rollups.
+
+``raw`` has one row per frame and one column per ``frame.FIELDS`` entry,
+keyed by the host receive time ``t``.  ``rollup_<res>`` has one row per
+bucket with the count and a ``min``/``max``/``sum`` column per series, i.e.
+every field but ``ts``.  Flags are stored as 0/1, so ``max`` tells whether
+one was set during the bucket and the mean for how much of it.  Buckets are
+aggregated in memory and upserted when they close, so a restart merges into
+the stored bucket.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import frame
+from .downsample import lttb, minmax
+
+log = logging.getLogger(__name__)
+
+DB_PATH = "telemetry.db"
+
+RESOLUTIONS = (1, 60, 3600)                   # rollup bucket sizes, s
+RETENTION = {                                 # s to keep, None = forever
+    "raw": 6 * 3600,
+    1: 2 * 24 * 3600,
+    60: 90 * 24 * 3600,
+    3600: None,
+}
+FLUSH_INTERVAL = 1.0     # s between batched commits
+PRUNE_INTERVAL = 600.0   # s between retention sweeps
+
+RAW_RATE = 10            # nominal frames/s, to estimate raw row counts
+MAX_ROWS = 20000         # finest source a query may scan
+
+# every series but the Teensy clock gets rollups; "ts" is kept raw only
+SERIES = tuple(f for f in frame.FIELDS if f != "ts")
+_SERIES_IDX = tuple(frame.FIELDS.index(s) for s in SERIES)
+
+_COLS = ", ".join(f'"{f}"' for f in frame.FIELDS)
+_AGG_COLS = [f'"{s}.{a}"' for s in SERIES for a in ("min", "max", "sum")]
+_UPSERT = (
+    "INSERT INTO rollup_{res} (bucket, n, " + ", ".join(_AGG_COLS) + ") VALUES ("
+    + ", ".join("?" * (len(_AGG_COLS) + 2)) + ") ON CONFLICT (bucket) DO UPDATE SET "
+    "n = n + excluded.n, " + ", ".join(
+        # coalesce: columns added to an existing table are NULL in old buckets
+        f'"{s}.min" = min(coalesce("{s}.min", excluded."{s}.min"), excluded."{s}.min"), '
+        f'"{s}.max" = max(coalesce("{s}.max", excluded."{s}.max"), excluded."{s}.max"), '
+        f'"{s}.sum" = coalesce("{s}.sum", 0) + excluded."{s}.sum"' for s in SERIES)
+)
+
+
+class _Bucket:
+    """Aggregates of one bucket of one resolution for every series."""
+
+    __slots__ = ("key", "n", "min", "max", "sum")
+
+    def __init__(self, key: int):
+        self.key = key
+        self.n = 0
+        self.min: List[float] = []
+        self.max: List[float] = []
+        self.sum: List[float] = []
+
+    def add(self, n: int, sums, lo, hi) -> None:
+        if not self.n:
+            self.min, self.max, self.sum = list(lo), list(hi), list(sums)
+        else:
+            self.min = [a if a < b else b for a, b in zip(self.min, lo)]
+            self.max = [a if a > b else b for a, b in zip(self.max, hi)]
+            self.sum = [a + b for a, b in zip(self.sum, sums)]
+        self.n += n
+
+    def row(self) -> tuple:
+        return (self.key, self.n,
+                *(v for i in range(len(SERIES)) for v in (self.min[i], self.max[i], self.sum[i])))
+
+
+class HistoryStore:
+    def __init__(self, path: str = DB_PATH, readonly: bool = False):
+        uri = f"file:{path}?mode=ro" if readonly else f"file:{path}"
+        self.db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        if readonly:
+            return
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        cols = ", ".join(f'"{f}" REAL' for f in frame.FIELDS)
+        aggs = ", ".join(f"{c} REAL" for c in _AGG_COLS)
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS raw (t REAL NOT NULL, {cols})")
+        self.db.execute("CREATE INDEX IF NOT EXISTS raw_t ON raw(t)")
+        for res in RESOLUTIONS:
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS rollup_{res} "
+                            f"(bucket INTEGER PRIMARY KEY, n INTEGER, {aggs})")
+            have = {r[1] for r in self.db.execute(f"PRAGMA table_info(rollup_{res})")}
+            for c in _AGG_COLS:             # flags joined the rollups later
+                if c.strip('"') not in have:
+                    self.db.execute(f"ALTER TABLE rollup_{res} ADD COLUMN {c} REAL")
+        self._rows: List[tuple] = []
+        self._closed: Dict[int, List[tuple]] = {res: [] for res in RESOLUTIONS}
+        self._open: Dict[int, _Bucket] = {}       # res -> current bucket
+        self._last_flush = self._last_prune = time.monotonic()
+
+    # -- writing ---------------------------------------------------------
+    def add(self, pkts: Iterable[dict]) -> None:
+        for pkt in pkts:
+            t = pkt.get("rx") or time.time()
+            vals = frame.values(pkt)
+            self._rows.append((t, *vals))
+            vals = [float(vals[i]) for i in _SERIES_IDX]
+            self._roll(0, t, 1, vals, vals, vals)
+        self.tick()
+
+    def _roll(self, level: int, t: float, n: int, sums, lo, hi) -> None:
+        """Add to the bucket of ``RESOLUTIONS[level]``; closed buckets cascade."""
+        res = RESOLUTIONS[level]
+        key = int(t // res) * res
+        b = self._open.get(res)
+        if b is not None and b.key != key:
+            self._close(level, b)
+            b = None
+        if b is None:
+            b = self._open[res] = _Bucket(key)
+        b.add(n, sums, lo, hi)
+
+    def _close(self, level: int, b: _Bucket) -> None:
+        self._closed[RESOLUTIONS[level]].append(b.row())
+        if level + 1 < len(RESOLUTIONS):
+            self._roll(level + 1, b.key, b.n, b.sum, b.min, b.max)
+
+    def tick(self) -> None:
+        """Commit and prune when due; call it regularly even without frames."""
+        now = time.monotonic()
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = now
+            self.prune()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._rows and not any(self._closed.values()):
+            return
+        marks = ", ".join("?" * (len(frame.FIELDS) + 1))
+        try:
+            with self.db:
+                self.db.executemany(
+                    f"INSERT INTO raw (t, {_COLS}) VALUES ({marks})", self._rows)
+                for res, rows in self._closed.items():
+                    self.db.executemany(_UPSERT.format(res=res), rows)
+        except sqlite3.Error as e:
+            log.warning("history write failed: %s", e)
+        self._rows = []
+        self._closed = {res: [] for res in RESOLUTIONS}
+
+    def prune(self) -> None:
+        now = time.time()
+        try:
+            with self.db:
+                keep = RETENTION["raw"]
+                if keep:
+                    self.db.execute("DELETE FROM raw WHERE t < ?", (now - keep,))
+                for res in RESOLUTIONS:
+                    keep = RETENTION[res]
+                    if keep:
+                        self.db.execute(f"DELETE FROM rollup_{res} WHERE bucket < ?",
+                                        (now - keep,))
+        except sqlite3.Error as e:
+            log.warning("history prune failed: %s", e)
+
+    def close(self) -> None:
+        """Write partial buckets too; a restart merges into them."""
+        if not self.readonly:
+            for level, res in enumerate(RESOLUTIONS):
+                b = self._open.pop(res, None)
+                if b is not None:
+                    self._close(level, b)
+            self.flush()
+        self.db.close()
+
+    # -- reading ---------------------------------------------------------
+    def query(self, series: str, t0: float, t1: float, points: int = 500,
+              mode: str = "lttb") -> Dict[str, Any]:
+        """Decimated ``series`` between ``t0`` and ``t1`` (epoch s).
+
+        The finest source holding the range within ``MAX_ROWS`` is used: raw
+        frames or a rollup table.  ``mode`` "lttb" returns ``t``/``v``,
+        "minmax" returns ``t``/``min``/``max``; arrays are column-wise.
+        """
+        if series not in frame.FIELDS:
+            raise KeyError(series)
+        res = self._source(series, t0, t1)
+        with self._lock:
+            if res is None:
+                rows = self.db.execute(
+                    f'SELECT t, "{series}" FROM raw WHERE t >= ? AND t <= ? ORDER BY t',
+                    (t0, t1)).fetchall()
+                t = [r[0] for r in rows]
+                lo = hi = avg = [r[1] for r in rows]
+            else:
+                rows = self.db.execute(
+                    f'SELECT bucket, "{series}.min", "{series}.max", "{series}.sum" / n '
+                    f"FROM rollup_{res} WHERE bucket >= ? AND bucket <= ? "
+                    f'AND "{series}.min" IS NOT NULL ORDER BY bucket',   # NULL: pre-migration
+                    (t0 - res, t1)).fetchall()
+                t = [r[0] for r in rows]
+                lo, hi, avg = ([r[i] for r in rows] for i in (1, 2, 3))
+        out: Dict[str, Any] = {"series": series, "from": t0, "to": t1, "mode": mode,
+                               "source": "raw" if res is None else f"{res}s"}
+        if mode == "minmax":
+            out["t"], out["min"], out["max"] = minmax(t, lo, hi, points)
+        else:
+            out["t"], out["v"] = lttb(t, avg, points)
+        return out
+
+    def _source(self, series: str, t0: float, t1: float) -> Optional[int]:
+        """``None`` for raw frames, else the rollup resolution to read."""
+        if series not in SERIES:            # "ts" has no rollups
+            return None
+        age = time.time() - t0
+        span = max(t1 - t0, 0.0)
+        keep = RETENTION["raw"]
+        if span * RAW_RATE <= MAX_ROWS and (keep is None or age <= keep):
+            return None
+        for res in RESOLUTIONS:
+            keep = RETENTION[res]
+            if span / res <= MAX_ROWS and (keep is None or age <= keep):
+                return res
+        return RESOLUTIONS[-1]
@@ -1,16 +1,26 @@
-import json, logging, queue
-from logging.handlers import RotatingFileHandler
+import signal
+from . import drivers, metrics
+from .bus import receive, watch
+from .history import HistoryStore
+from .telemetry_log import TelemetryLog
 
-def run(q):
-    log = logging.getLogger("logger")
-    fh  = RotatingFileHandler("telemetry.log", maxBytes=1_000_000, backupCount=5)
-    fh.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
-    log.addHandler(fh); log.setLevel(logging.INFO)
-    while True:
-        try:
-            pkt = q.get(timeout=1)
-            if pkt.get("type") == "telemetry":
-                log.info(json.dumps(pkt))
-        except queue.Empty:
-            continue
+def _stop(signum, frame):
+    raise SystemExit
 
+def run(q):
+    tlog    = TelemetryLog()           # compressed blocks, see telemetry_log.py
+    history = HistoryStore()           # batched, with 1 s / 1 min / 1 h rollups
+    write   = metrics.histogram("logger_write_seconds", "Log and history time per batch")
+    watch(q)
+    metrics.start_exporter("logger")
+    drivers.ready("logger")
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        while True:
+            pkts = [p for p in receive(q) if p.get("type") == "telemetry"]
+            with write.time():
+                tlog.write(pkts)       # also on timeouts: flushes on its own schedule
+                history.add(pkts)      # commits on its own schedule
+    finally:
+        tlog.close()
+        history.close()
@@ -0,0 +1,228 @@
+"""Counters, gauges and histograms exported in the Prometheus text format.
+
+Every worker process keeps its own registry.  ``start_exporter`` writes it
+as JSON to ``METRICS_DIR/<worker>.json`` every few seconds; the web API
+merges those files with its own registry for ``/metrics``, adding a
+``worker`` label (similar to prometheus_client's multiprocess mode).
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+METRICS_DIR = "/dev/shm/burning-control-metrics"
+EXPORT_INTERVAL = 2.0
+STALE_AFTER = 30.0       # s; snapshots of dead workers are ignored
+
+# seconds, 0.5 ms .. 2.5 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Dict[str, str]):
+        self.name, self.help, self.labels = name, help, labels
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a):
+        super().__init__(*a)
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+    def dump(self) -> dict:
+        return {"value": self.value}
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)    # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def dump(self) -> dict:
+        return {"buckets": self.buckets, "counts": list(self.counts), "sum": self.sum}
+
+
+class _Timer:
+    __slots__ = ("h", "start")
+
+    def __init__(self, h: Histogram):
+        self.h = h
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.start)
+
+
+_registry: Dict[_Key, _Metric] = {}
+_lock = threading.Lock()
+_collectors: List[Callable[[], None]] = []
+
+
+def _get(cls, name: str, help: str, labels: Dict[str, str], **kw):
+    key = (name, tuple(sorted(labels.items())))
+    m = _registry.get(key)
+    if m is None:
+        with _lock:
+            m = _registry.get(key)
+            if m is None:
+                m = _registry[key] = cls(name, help, labels, **kw)
+    return m
+
+
+def counter(name: str, help: str = "", **labels) -> Counter:
+    return _get(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str = "", **labels) -> Gauge:
+    return _get(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str = "", buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+    return _get(Histogram, name, help, labels, buckets=buckets)
+
+
+def on_collect(fn: Callable[[], None]) -> None:
+    """Call ``fn`` before every export, e.g. to set gauges from other state."""
+    _collectors.append(fn)
+
+
+def process_age() -> float:
+    """Seconds since this process started (forked or not), from /proc."""
+    try:
+        with open("/proc/self/stat") as f:
+            start = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(0.0, uptime - start / os.sysconf("SC_CLK_TCK"))
+
+
+def snapshot() -> List[dict]:
+    for fn in _collectors:
+        try:
+            fn()
+        except Exception as e:
+            log.warning("metrics collector failed: %s", e)
+    return [{"name": m.name, "type": m.kind, "help": m.help, "labels": m.labels, **m.dump()}
+            for m in list(_registry.values())]
+
+
+# -- export between processes --------------------------------------------
+def export(worker: str, metrics: Optional[List[dict]] = None) -> None:
+    """Write ``metrics`` (default: this registry's snapshot) for ``render``."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{worker}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot() if metrics is None else metrics, f)
+    os.replace(path + ".tmp", path)
+
+
+def start_exporter(worker: str, interval: float = EXPORT_INTERVAL) -> None:
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                export(worker)
+            except OSError as e:
+                log.warning("metrics export failed: %s", e)
+
+    threading.Thread(target=loop, daemon=True, name="metrics").start()
+
+
+def _exported(skip: str) -> Iterable[Tuple[str, List[dict]]]:
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    now = time.time()
+    for fn in sorted(names):
+        worker, ext = os.path.splitext(fn)
+        if ext != ".json" or worker == skip:
+            continue
+        path = os.path.join(METRICS_DIR, fn)
+        try:
+            if now - os.path.getmtime(path) > STALE_AFTER:
+                continue
+            with open(path) as f:
+                yield worker, json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+# -- text format ----------------------------------------------------------
+def _escape(v) -> str:
+    return str(v).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _labels(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items.items()) + "}"
+
+
+def render(worker: str) -> str:
+    """All workers' metrics; ``worker`` is this process' own name."""
+    groups: Dict[str, List[Tuple[dict, str]]] = {}
+    for w, metrics in [(worker, snapshot()), *_exported(worker)]:
+        for m in metrics:
+            groups.setdefault(m["name"], []).append((m, w))
+    out = []
+    for name in sorted(groups):
+        first = groups[name][0][0]
+        out.append(f"# HELP {name} {first['help']}")
+        out.append(f"# TYPE {name} {first['type']}")
+        for m, w in groups[name]:
+            labels = {**m["labels"], "worker": w}
+            if m["type"] != "histogram":
+                out.append(f"{name}{_labels(labels)} {m['value']}")
+                continue
+            total = 0
+            for le, n in zip([*m["buckets"], "+Inf"], m["counts"]):
+                total += n
+                out.append(f"{name}_bucket{_labels(labels, {'le': le})} {total}")
+            out.append(f"{name}_sum{_labels(labels)} {m['sum']}")
+            out.append(f"{name}_count{_labels(labels)} {total}")
+    return "\n".join(out) + "\n"
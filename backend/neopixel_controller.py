@@ -1,20 +1,33 @@
-import board
-import neopixel
+import os
 import time
 import logging
-from threading import Lock, Thread, current_thread
+from threading import Event, Lock, Thread
+
+from . import drivers
+
+try:  # pragma: no cover - optional, speeds up crossfades
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
 
 log = logging.getLogger(__name__)
 
-LED_COUNT = 7
-LED_PIN = board.D18
+LED_COUNT = int(os.environ.get("LED_COUNT", 7))
+LED_PIN = "D18"     # board pin, looked up when the strip is first used
 BRIGHTNESS = 0.3
+FPS = int(os.environ.get("LED_FPS", 50))
+FADE = 0.3          # s crossfade between effects
+RETRY = 5.0         # s between attempts to open a missing strip
 
 def _init_pixels():
-    global _pixels
+    global _pixels, _next_try
+    _next_try = time.monotonic() + RETRY
+    neopixel, pin = drivers.get("neopixel"), drivers.pin(LED_PIN)
+    if neopixel is None or pin is None:
+        return
     try:
         _pixels = neopixel.NeoPixel(
-            LED_PIN,
+            pin,
             LED_COUNT,
             brightness=BRIGHTNESS,
             auto_write=False,
@@ -25,110 +38,304 @@ def _init_pixels():
         _pixels = None
 
 def _ensure_pixels():
-    if _pixels is None:
+    if _pixels is None and time.monotonic() >= _next_try:
         _init_pixels()
 
-_pixels = None
-_init_pixels()
+_pixels = None      # opened on the first frame, not at import
+_next_try = 0.0
 _lock = Lock()
-_current_thread = None
+
+
+# ---------------------------------------------------------------------------
+# Effects: every frame is precomputed as LED_COUNT * 3 bytes of RGB
+
+class Effect:
+    """Looping frames shown ``step`` s each; ``speed`` scales the playback."""
+
+    def __init__(self, frames, step=1.0, speed=1.0):
+        self.frames = frames
+        self.step = step
+        self.speed = speed
+
+    @property
+    def static(self):
+        return len(self.frames) == 1
+
+    def frame(self, t):
+        return self.frames[int(t * self.speed / self.step) % len(self.frames)]
+
+
+def wheel(pos):
+    if pos < 85:
+        return (pos * 3, 255 - pos * 3, 0)
+    elif pos < 170:
+        pos -= 85
+        return (255 - pos * 3, 0, pos * 3)
+    else:
+        pos -= 170
+        return (0, pos * 3, 255 - pos * 3)
+
+_WHEEL = [wheel(p) for p in range(256)]
+
+
+def solid(color, n=None):
+    return Effect([bytes(color) * (n or LED_COUNT)])
+
+def rainbow(n=None):
+    n = n or LED_COUNT
+    offsets = [i * 256 // n for i in range(n)]
+    return Effect([b"".join(bytes(_WHEEL[(o + j) & 255]) for o in offsets)
+                   for j in range(256)], step=0.02)
+
+def pulse(n=None, color=(255, 0, 0)):
+    n = n or LED_COUNT
+    ramp = list(range(0, 256, 5)) + list(range(255, -1, -5))
+    return Effect([bytes(c * b // 255 for c in color) * n for b in ramp], step=0.02)
+
+def chase(n=None, color=(0, 255, 0)):
+    n = n or LED_COUNT
+    frames = []
+    for i in range(n):
+        buf = bytearray(3 * n)
+        buf[3 * i:3 * i + 3] = bytes(color)
+        frames.append(bytes(buf))
+    return Effect(frames, step=0.1)
+
+EFFECTS = {"rainbow": rainbow, "pulse": pulse, "chase": chase}
+
+
+# ---------------------------------------------------------------------------
+# Telemetry-reactive effects, computed on every scheduler tick from the latest
+# frame (the reader's shared memory, see set_source)
+
+_source = None      # () -> newest telemetry dict or None
+
+def set_source(fn):
+    """Where reactive effects get the newest telemetry frame from."""
+    global _source
+    _source = fn
+
+def _gradient(x):
+    """Green at 0 through yellow to red at 1."""
+    return (min(255, int(510 * x)), min(255, int(510 * (1 - x))), 0)
+
+
+class Reactive(Effect):
+    """One telemetry ``field``, scaled from ``lo``..``hi`` to 0..1, drives
+
+    ``hue``    the whole strip on a green -> red gradient
+    ``bar``    a level meter in gradient colors
+    ``speed``  the playback speed of ``effect`` (0.2x .. 5x)
+    ``pulse``  gradient up to ``hi``, above it a red pulse that gets faster
+    """
+
+    def __init__(self, field, mode="hue", lo=0.0, hi=1.0, effect="rainbow", n=None):
+        super().__init__([b""], step=0.02)
+        self.group, _, self.key = field.partition(".")
+        self.mode, self.lo, self.hi = mode, lo, hi
+        self.n = n or LED_COUNT
+        self.base = EFFECTS[effect](self.n) if mode == "speed" else None
+        self._phase = 0.0
+        self._last = None
+
+    @property
+    def static(self):
+        return False
+
+    def _value(self):
+        d = _source() if _source is not None else None
+        if not d:
+            return None
+        v = d.get(self.group)
+        if self.key:
+            v = (v or {}).get(self.key)
+        return v
+
+    def frame(self, t):
+        v = self._value()
+        if v is None:
+            return bytes(3 * self.n)
+        x = (v - self.lo) / ((self.hi - self.lo) or 1.0)
+        over = x - 1.0
+        x = max(0.0, min(1.0, x))
+        if self.mode == "bar":
+            lit = round(x * self.n)
+            return b"".join(bytes(_gradient(i / max(1, self.n - 1))) if i < lit else b"\0\0\0"
+                            for i in range(self.n))
+        if self.mode == "speed":
+            dt = t - self._last if self._last is not None else 0.0
+            self._last = t
+            self._phase += dt * 0.2 * 25 ** x      # integrated, so no jumps
+            return self.base.frame(self._phase)
+        if self.mode == "pulse" and over > 0:
+            hz = 1.0 + 4.0 * min(1.0, over)
+            b = abs((t * hz) % 2.0 - 1.0)            # triangle 0..1
+            return bytes((int(255 * b), 0, 0)) * self.n
+        return bytes(_gradient(x)) * self.n
+
+
+MODES = ("hue", "bar", "speed", "pulse")
+
+REACTIVE = {
+    "current": {"field": "voltageSensorV24.current", "mode": "hue", "lo": 0.0, "hi": 2.0},
+    "power-bar": {"field": "voltageSensorV24.power", "mode": "bar", "lo": 0.0, "hi": 48.0},
+    "overheat": {"field": "temperatureSensor1.temperature", "mode": "pulse",
+                 "lo": 20.0, "hi": 45.0},
+    "load-rainbow": {"field": "voltageSensorV24.current", "mode": "speed",
+                     "lo": 0.0, "hi": 2.0},
+}
+
+
+def _blend(a, b, x):
+    """``a`` faded into ``b`` by ``x`` in 0..1."""
+    if np is not None:
+        fa = np.frombuffer(a, dtype=np.uint8).astype(np.float32)
+        fb = np.frombuffer(b, dtype=np.uint8).astype(np.float32)
+        return (fa + (fb - fa) * x).astype(np.uint8).tobytes()
+    return bytes(int(p + (q - p) * x) for p, q in zip(a, b))
+
+
+# ---------------------------------------------------------------------------
+# One scheduler thread drives the strip on a fixed-rate monotonic clock
+
+class _Engine(Thread):
+    def __init__(self, fps=FPS):
+        super().__init__(daemon=True, name="leds")
+        self.period = 1.0 / fps
+        self._state = Lock()
+        self._wake = Event()
+        self.effect = solid((0, 0, 0))
+        self.started = time.monotonic()
+        self.fade = None            # (old effect, its start, fade start, duration)
+        self.shown = None           # bytes last written
+        self.frames = 0
+
+    def play(self, effect, fade=FADE):
+        now = time.monotonic()
+        with self._state:
+            if fade > 0:
+                self.fade = (self.effect, self.started, now, fade)
+            self.effect, self.started = effect, now
+        self._wake.set()
+
+    def refresh(self):
+        """Write the current frame again, e.g. after a brightness change."""
+        self.shown = None
+        self._wake.set()
+
+    def render(self, now):
+        with self._state:
+            effect, started, fade = self.effect, self.started, self.fade
+        buf = effect.frame(now - started)
+        if fade is not None:
+            old, old_started, fade_start, duration = fade
+            x = (now - fade_start) / duration
+            if x >= 1.0:
+                with self._state:
+                    if self.fade is fade:
+                        self.fade = None
+            else:
+                buf = _blend(old.frame(now - old_started), buf, x)
+        return buf, effect.static and self.fade is None
+
+    def run(self):
+        deadline = time.monotonic()
+        while True:
+            now = time.monotonic()
+            try:
+                buf, static = self.render(now)
+                if buf != self.shown:
+                    self._show(buf)
+                    self.shown = buf
+                    self.frames += 1
+            except Exception as e:  # a broken effect must not stop the strip
+                log.warning("LED effect failed, switching off: %s", e)
+                with self._state:
+                    self.effect, self.started, self.fade = solid((0, 0, 0)), now, None
+                self._wake.wait(self.period)
+                self._wake.clear()
+                deadline = time.monotonic()
+                continue
+            if static:              # nothing moves until the next play()
+                self._wake.wait()
+                self._wake.clear()
+                deadline = time.monotonic()
+                continue
+            deadline += self.period
+            now = time.monotonic()
+            if deadline < now:      # overran: skip frames instead of bursting
+                deadline = now
+            self._wake.wait(deadline - now)
+            self._wake.clear()
+
+    def _show(self, buf):
+        _ensure_pixels()
+        if _pixels is None:
+            return
+        with _lock:
+            try:
+                it = iter(buf)
+                _pixels[:] = list(zip(it, it, it))
+                _pixels.show()
+            except Exception as e:  # pragma: no cover - hardware error
+                log.warning("LED update failed: %s", e)
+
+
+_engine = _Engine()
+_engine_lock = Lock()
+
+
+def _start():
+    """Start the scheduler thread with the first command; replace a dead one."""
+    global _engine
+    if _engine.is_alive():
+        return
+    with _engine_lock:
+        if _engine.is_alive():
+            return
+        if _engine.ident is not None:   # ran and exited: threads start only once
+            log.warning("LED scheduler thread died, starting a new one")
+            _engine = _Engine()
+        _engine.start()
+
+
+def play(effect, fade=FADE):
+    """Crossfade to ``effect``; returns at once."""
+    _start()
+    _engine.play(effect, fade)
+
+
+def current():
+    """The effect playing now (the target of a running crossfade)."""
+    return _engine.effect
 
 
 def fill(color):
-    """Fill the strip with a color, handling write errors."""
-    _ensure_pixels()
-    with _lock:
-        try:
-            _pixels.fill(color)
-            _pixels.show()
-        except Exception as e:  # pragma: no cover - hardware error
-            log.warning("LED update failed: %s", e)
+    """Fill the strip with a color."""
+    play(solid(tuple(color)))
 
 def off():
     fill((0, 0, 0))
 
 def set_brightness(value):
-    global _pixels
+    _start()
     _ensure_pixels()
+    if _pixels is None:
+        return
     with _lock:
         _pixels.brightness = max(0.0, min(0.5, value))  # Clamp to 0.5
-        try:
-            _pixels.show()
-        except Exception as e:  # pragma: no cover - hardware error
-            log.warning("LED brightness update failed: %s", e)
-
-def run_animation(name):
-    global _current_thread
-
-    def stop_previous():
-        if _current_thread and _current_thread.is_alive():
-            _current_thread.do_run = False
-            _current_thread.join()
-
-    def animation_runner(target):
-        t = Thread(target=target, daemon=True)
-        t.do_run = True
-        t.start()
-        return t
-
-    def rainbow():
-        t = current_thread()
-        while getattr(t, "do_run", True):
-            _ensure_pixels()
-            for j in range(256):
-                with _lock:
-                    for i in range(LED_COUNT):
-                        pixel_index = (i * 256 // LED_COUNT) + j
-                        _pixels[i] = wheel(pixel_index & 255)
-                    try:
-                        _pixels.show()
-                    except Exception as e:  # pragma: no cover - hardware error
-                        log.warning("LED update failed: %s", e)
-                        return
-                time.sleep(0.02)
-
-    def pulse():
-        t = current_thread()
-        while getattr(t, "do_run", True):
-            _ensure_pixels()
-            for b in range(0, 256, 5):
-                fill((b, 0, 0))
-                time.sleep(0.02)
-            for b in range(255, -1, -5):
-                fill((b, 0, 0))
-                time.sleep(0.02)
-
-    def chase():
-        t = current_thread()
-        while getattr(t, "do_run", True):
-            _ensure_pixels()
-            for i in range(LED_COUNT):
-                fill((0, 0, 0))
-                with _lock:
-                    _pixels[i] = (0, 255, 0)
-                    try:
-                        _pixels.show()
-                    except Exception as e:  # pragma: no cover - hardware error
-                        log.warning("LED update failed: %s", e)
-                        return
-                time.sleep(0.1)
-
-    def wheel(pos):
-        if pos < 85:
-            return (pos * 3, 255 - pos * 3, 0)
-        elif pos < 170:
-            pos -= 85
-            return (255 - pos * 3, 0, pos * 3)
-        else:
-            pos -= 170
-            return (0, pos * 3, 255 - pos * 3)
-
-    stop_previous()
-    if name == 'rainbow':
-        _current_thread = animation_runner(rainbow)
-    elif name == 'pulse':
-        _current_thread = animation_runner(pulse)
-    elif name == 'chase':
-        _current_thread = animation_runner(chase)
-    else:
+    _engine.refresh()
+
+_frames = {}        # effect name -> precomputed frames and step
+
+def run_animation(name, speed=1.0):
+    if name in REACTIVE:
+        play(Reactive(**REACTIVE[name]))
+        return
+    if name not in EFFECTS:
         off()
+        return
+    if name not in _frames:
+        e = EFFECTS[name]()
+        _frames[name] = (e.frames, e.step)
+    play(Effect(*_frames[name], speed=speed))
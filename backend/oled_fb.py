@@ -0,0 +1,190 @@
+"""SSD1306 framebuffer with a glyph cache and dirty-page transfers.
+
+``FrameBuffer`` keeps the controller's own memory layout: one byte per
+column per page of 8 rows, LSB on top.  Text is drawn from column bitmaps
+rendered once per character, so a frame costs no PIL calls.  ``Panel.flush``
+compares with what the display already shows and sends only the changed
+column span of each changed page over I2C, or nothing at all.
+"""
+
+from typing import Dict, Tuple
+
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+_WINDOW_COST = 6 * 2        # bytes of the six address commands
+
+
+def _advance(font, ch: str) -> int:
+    """Advance of ``ch`` as rendered without antialiasing (mono hinting)."""
+    try:
+        return round(font.getlength(ch, mode="1"))
+    except (AttributeError, TypeError):     # Pillow < 9.2
+        return font.getsize(ch)[0]
+
+
+def _height(font) -> int:
+    try:
+        return font.getbbox("Ag")[3]
+    except AttributeError:                  # Pillow < 9.2
+        return font.getsize("Ag")[1]
+
+
+class Glyphs:
+    """Column bitmaps of a PIL font, rendered on first use of a character."""
+
+    def __init__(self, font, height: int = 0):
+        from PIL import Image, ImageDraw
+        self._image, self._draw = Image, ImageDraw
+        self.font = font
+        self.height = height or min(16, _height(font))
+        self._cache: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+
+    def get(self, ch: str) -> Tuple[int, Tuple[int, ...]]:
+        """``(advance, columns)``; bit ``i`` of a column is row ``i``."""
+        g = self._cache.get(ch)
+        if g is None:
+            width = max(1, _advance(self.font, ch))
+            img = self._image.new("1", (width, self.height))
+            self._draw.Draw(img).text((0, 0), ch, font=self.font, fill=255)
+            px = img.load()
+            cols = tuple(sum(1 << y for y in range(self.height) if px[x, y])
+                         for x in range(width))
+            g = self._cache[ch] = (width, cols)
+        return g
+
+
+class FrameBuffer:
+    def __init__(self, width: int, height: int, glyphs: Glyphs):
+        self.width, self.height = width, height
+        self.pages = height // 8
+        self.glyphs = glyphs
+        self.buf = bytearray(width * self.pages)
+
+    def clear(self) -> None:
+        self.buf[:] = bytes(len(self.buf))
+
+    def _column(self, x: int, y: int, bits: int) -> None:
+        """OR ``bits`` (bit 0 = row ``y``) into column ``x``."""
+        if not 0 <= x < self.width or not bits:
+            return
+        if y < 0:
+            bits >>= -y
+            y = 0
+        page, bits = y >> 3, bits << (y & 7)
+        buf, w = self.buf, self.width
+        while bits and page < self.pages:
+            buf[page * w + x] |= bits & 0xFF
+            bits >>= 8
+            page += 1
+
+    def pixel(self, x: int, y: int) -> None:
+        if 0 <= y < self.height:
+            self._column(x, y, 1)
+
+    def vline(self, x: int, y: int, h: int) -> None:
+        self._column(x, y, (1 << h) - 1)
+
+    def hline(self, x: int, y: int, w: int) -> None:
+        for i in range(max(0, x), min(self.width, x + w)):
+            self.pixel(i, y)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """Straight line, drawn as one vertical run per column."""
+        if x1 < x0:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        if x0 == x1:
+            lo = min(y0, y1)
+            self.vline(x0, lo, abs(y1 - y0) + 1)
+            return
+        prev = y0
+        for x in range(x0, x1 + 1):
+            y = y0 + (y1 - y0) * (x - x0) // (x1 - x0)
+            lo, hi = min(prev, y), max(prev, y)
+            self.vline(x, lo, hi - lo + 1)
+            prev = y
+
+    def sparkline(self, x: int, y: int, w: int, h: int, values) -> None:
+        """The last ``w`` of ``values`` scaled into a ``w`` x ``h`` box,
+        newest at the right; ``None`` leaves a gap."""
+        vals = list(values)[-w:]
+        pts = [v for v in vals if v is not None]
+        if not pts:
+            return
+        lo, hi = min(pts), max(pts)
+        x0, prev = x + w - len(vals), None
+        for i, v in enumerate(vals):
+            if v is None:
+                prev = None
+                continue
+            py = y + h - 1 - round((v - lo) * (h - 1) / (hi - lo)) if hi > lo else y + h // 2
+            if prev is None:
+                self.pixel(x0 + i, py)
+            else:
+                self.line(x0 + i - 1, prev, x0 + i, py)
+            prev = py
+
+    def text(self, x: int, y: int, s: str) -> int:
+        """Draw ``s`` with its top left at ``x``, ``y``; returns the end x."""
+        for ch in s:
+            width, cols = self.glyphs.get(ch)
+            for i, bits in enumerate(cols):
+                self._column(x + i, y, bits)
+            x += width
+        return x
+
+    def text_width(self, s: str) -> int:
+        return sum(self.glyphs.get(ch)[0] for ch in s)
+
+
+class Panel:
+    """Pushes a ``FrameBuffer`` to an adafruit ``SSD1306_I2C``."""
+
+    def __init__(self, display):
+        self.display = display
+        self.width = display.width
+        self.offset = (128 - self.width) // 2 if self.width != 128 else 0
+        self.shown = None           # what the display shows, unknown at first
+
+    def invalidate(self) -> None:
+        self.shown = None
+
+    def _window(self, x0: int, x1: int, p0: int, p1: int) -> None:
+        cmd = self.display.write_cmd
+        for c in (SET_COL_ADDR, x0 + self.offset, x1 + self.offset, SET_PAGE_ADDR, p0, p1):
+            cmd(c)
+
+    def _write(self, data) -> None:
+        dev = self.display.i2c_device
+        with dev:
+            dev.write(b"\x40" + bytes(data))
+
+    def flush(self, fb: FrameBuffer) -> int:
+        """Send what changed; returns the number of data bytes written."""
+        buf, w = fb.buf, self.width
+        if buf == self.shown:
+            return 0
+        if self.shown is None:
+            spans = [(p, 0, w) for p in range(fb.pages)]
+        else:
+            spans = []
+            for p in range(fb.pages):
+                row, old = buf[p * w:(p + 1) * w], self.shown[p * w:(p + 1) * w]
+                if row == old:
+                    continue
+                x0 = next(i for i in range(w) if row[i] != old[i])
+                x1 = next(i for i in range(w - 1, -1, -1) if row[i] != old[i]) + 1
+                spans.append((p, x0, x1))
+        if not spans:
+            return 0
+        partial = sum(x1 - x0 + _WINDOW_COST for _, x0, x1 in spans)
+        if partial >= len(buf) + _WINDOW_COST:
+            self._window(0, w - 1, 0, fb.pages - 1)
+            self._write(buf)
+            sent = len(buf)
+        else:
+            for p, x0, x1 in spans:
+                self._window(x0, x1 - 1, p, p)
+                self._write(buf[p * w + x0:p * w + x1])
+            sent = partial - _WINDOW_COST * len(spans)
+        self.shown = bytearray(buf)
+        return sent
@@ -1,73 +1,121 @@
-﻿# backend/oled_small.py — минимальный вывод пяти параметров на маленький OLED
+﻿# backend/oled_small.py — страницы телеметрии на маленьком OLED, листаются кнопками
 
 import logging
 from logging.handlers import RotatingFileHandler
+from collections import deque
+import functools
 import threading
 import time
-import queue
-from .telemetry_service import read_cpu_usage
+from .telemetry_service import sampler as pi_sampler
+from .bus import TelemetryBus, receive
+from .frame_store import FrameHistory, FrameStore
+from . import drivers, metrics
+from .oled_fb import FrameBuffer, Glyphs, Panel
 import signal
 
-# --- попытка подключить аппаратные библиотеки ---
-try:
-    import board, busio  # type: ignore
-    from PIL import Image, ImageDraw, ImageFont
-    import adafruit_ssd1306  # type: ignore
-except Exception as e:  # pragma: no cover – запускаем и без железа
-    board = busio = None
-    Image = ImageDraw = ImageFont = adafruit_ssd1306 = None
-    logging.error("OLED libs unavailable: %s", e)
+# аппаратные библиотеки подключаются через drivers при создании OLED;
+# без них экран просто не рисуется
+
+BUTTON_LEFT = 5    # BCM, board.D5
+BUTTON_RIGHT = 6   # BCM, board.D6
+BOUNCE = 0.05      # с
+
+# (заголовок, группа) страниц шин питания
+RAILS = (("V24", "voltageSensorV24"), ("V5", "voltageSensorV5"),
+         ("V5 Pi", "voltageSensorV5PiBrain"), ("V3", "voltageSensorV3"))
+HISTORY_STEP = 1.0  # с между точками графиков; 64 точки = последняя минута
 
 # ---------------------------------------------------------------------------
-# Глобальный кеш, обновляемый из очереди
+# Последний кадр: из общей памяти reader'а, либо из очереди при запуске без main.py
+_store = None
 _teency_data: dict = {}
 
-# ---------------------------------------------------------------------------
-class _NullDraw:
-    """Fallback drawing object used when no OLED is attached."""
+_render_time = metrics.histogram("oled_render_seconds", "Draw and I2C transfer per screen")
+_frame_age = metrics.gauge("oled_frame_age_seconds", "Age of the frame on the screen")
+_bytes_sent = metrics.counter("oled_i2c_bytes_total", "Framebuffer bytes written over I2C")
 
-    def rectangle(self, *a, **k):
-        pass
 
-    def text(self, *a, **k):
-        pass
+def _latest() -> dict:
+    if _store is not None:
+        _, rx, d = _store.read()
+        _frame_age.set(time.time() - rx if d else 0.0)
+        return d or {}
+    return _teency_data
 
 
+def _value(d: dict, field: str):
+    """``group.key`` из кадра; ``None`` если датчик недоступен."""
+    group, _, key = field.partition(".")
+    g = d.get(group) or {}
+    if not g.get("isAvailable", True):
+        return None
+    return g.get(key)
+
+# ---------------------------------------------------------------------------
 class OLED:
     WIDTH = 64
     HEIGHT = 48
+    REFRESH = 0.2  # с; без изменений по I2C ничего не передаётся
 
     def __init__(self, addr: int = 0x3C):
         self.addr = addr
         self.display = None
-        self.image = None
-        self.draw = _NullDraw()
-        self.font = None
+        self.panel = None
+        # буфер в формате SSD1306 и кэш глифов шрифта
+        font = drivers.get("pil_font")
+        self.fb = (FrameBuffer(self.WIDTH, self.HEIGHT, Glyphs(font.load_default()))
+                   if font is not None else None)
         self._last_try = 0.0  # last time we attempted to (re)connect
+        self.pages = ([self._overview]
+                      + [functools.partial(self._rail, t, g) for t, g in RAILS]
+                      + [self._temps, self._pi])
+        self.page = 0
+        # история для графиков: по точке в HISTORY_STEP
+        fields = ([f"{g}.current" for _, g in RAILS]
+                  + ["temperatureSensor1.temperature", "temperatureSensor2.temperature",
+                     "pi.cpu"])
+        self.history = {f: deque(maxlen=self.WIDTH) for f in fields}
+        self.pi: dict = {}
+        self._wake = threading.Event()
         self._setup()
+        self.buttons = self._buttons()
 
     def _setup(self):
-        if board is None:
-            self.draw = _NullDraw()
-            self.image = None
-            self.font = None
+        board, busio = drivers.get("board"), drivers.get("busio")
+        adafruit_ssd1306 = drivers.get("ssd1306")
+        if board is None or busio is None or adafruit_ssd1306 is None:
             return
         try:
             i2c = busio.I2C(board.SCL, board.SDA)
             self.display = adafruit_ssd1306.SSD1306_I2C(self.WIDTH, self.HEIGHT, i2c, addr=self.addr)
-            self.image   = Image.new("1", (self.WIDTH, self.HEIGHT))
-            self.draw    = ImageDraw.Draw(self.image)
-            self.font    = ImageFont.load_default()
+            self.panel = Panel(self.display)  # после переподключения экран шлётся целиком
             logging.info("OLED ready at 0x%X", self.addr)
             self._last_try = time.time()
         except Exception as e:  # pragma: no cover
             logging.warning("OLED init failed: %s", e)
             self.display = None
-            self.draw = _NullDraw()
-            self.image = None
-            self.font = None
+            self.panel = None
             self._last_try = time.time()
 
+    def _buttons(self):
+        gpiozero = drivers.get("gpiozero")  # фронты ловятся прерываниями, без опроса
+        if gpiozero is None:
+            return []
+        try:
+            left = gpiozero.Button(BUTTON_LEFT, bounce_time=BOUNCE)
+            right = gpiozero.Button(BUTTON_RIGHT, bounce_time=BOUNCE)
+        except Exception as e:  # pragma: no cover - нет GPIO
+            logging.warning("OLED buttons unavailable: %s", e)
+            return []
+        left.when_pressed = lambda: self.flip(-1)
+        right.when_pressed = lambda: self.flip(1)
+        return [left, right]
+
+    def flip(self, step: int):
+        """Следующая/предыдущая страница; перерисовка сразу."""
+        self.page = (self.page + step) % len(self.pages)
+        self._wake.set()
+
     def _update(self):
         if not self.display:
             if time.time() - self._last_try > 5:
@@ -75,12 +123,12 @@ class OLED:
                 self._setup()
             return
         try:
-            self.display.image(self.image)
-            self.display.show()
+            _bytes_sent.inc(self.panel.flush(self.fb))
         except OSError as e:  # pragma: no cover
             logging.warning("OLED I/O error: %s", e)
             logging.info("OLED disconnected")
             self.display = None
+            self.panel = None
             self._last_try = 0.0
 
     def poweroff(self):
@@ -95,30 +143,98 @@ class OLED:
         except Exception as e:  # pragma: no cover
             logging.warning("OLED poweroff failed: %s", e)
 
+    def sample(self):
+        """Точка истории для графиков и телеметрия Pi (раз в HISTORY_STEP)."""
+        d = _latest()
+        self.pi = pi_sampler().snapshot()
+        for field, ring in self.history.items():
+            ring.append(self.pi.get("cpu_usage") if field == "pi.cpu" else _value(d, field))
+
+    def warm_start(self):
+        """Графики за последнюю минуту из кадров reader'а (после перезапуска)."""
+        hist = FrameHistory.attach()
+        if hist is None:
+            return
+        pkts = hist.frames(time.time() - self.WIDTH * HISTORY_STEP)
+        hist.close()
+        t = 0.0
+        for d in pkts:
+            if d["rx"] - t < HISTORY_STEP:
+                continue
+            t = d["rx"]
+            for field, ring in self.history.items():
+                if field != "pi.cpu":
+                    ring.append(_value(d, field))
+
     def loop(self):
-        last = 0.0
+        next_at = next_sample = time.monotonic()
         while True:
-            now = time.time()
-            if now - last >= 0.5:
+            if time.monotonic() >= next_sample:
+                self.sample()
+                next_sample += HISTORY_STEP
+            with _render_time.time():
                 self.render()
-                last = now
-            time.sleep(0.05)
+            next_at += self.REFRESH
+            delay = next_at - time.monotonic()
+            if delay < 0:  # не успели — без догоняющих кадров
+                next_at, delay = time.monotonic(), 0.0
+            if self._wake.wait(delay):  # нажата кнопка
+                self._wake.clear()
+                next_at = time.monotonic()
 
     def render(self):
-        # получаем актуальные данные (или нули)
-        d = _teency_data or {}
-        cpu_raw = read_cpu_usage()
-        cpu = cpu_raw if cpu_raw is not None else 0.0
+        if self.fb is None:
+            return
+        fb = self.fb
+        fb.clear()
+        self.pages[self.page](fb, _latest())  # получаем актуальные данные (или нули)
+        self._update()
+
+    # -- страницы -------------------------------------------------------------
+    def _title(self, fb, title: str, right: str = ""):
+        """Заголовок слева, справа значение или номер страницы."""
+        fb.text(0, 0, title)
+        right = right or f"{self.page + 1}/{len(self.pages)}"
+        fb.text(self.WIDTH - fb.text_width(right), 0, right)
+
+    def _overview(self, fb, d):
+        cpu = self.pi.get("cpu_usage") or 0.0
         v5    = d.get("voltageSensorV5PiBrain", {})
         v3    = d.get("voltageSensorV3",       {})
+        fb.text(0,  0, f"CPU:{cpu:4.1f}%")
+        fb.text(0, 10, f"V5 :{v5.get('voltage',0):4.2f}V")
+        fb.text(0, 20, f"I5 :{v5.get('current',0):4.2f}A")
+        fb.text(0, 30, f"V3 :{v3.get('voltage',0):4.2f}V")
+        fb.text(0, 40, f"I3 :{v3.get('current',0):4.2f}A")
 
-        self.draw.rectangle((0, 0, self.WIDTH, self.HEIGHT), fill=0)  # clear
-        self.draw.text((0,  0), f"CPU:{cpu:4.1f}%",              font=self.font, fill=255)
-        self.draw.text((0, 10), f"V5 :{v5.get('voltage',0):4.2f}V", font=self.font, fill=255)
-        self.draw.text((0, 20), f"I5 :{v5.get('current',0):4.2f}A", font=self.font, fill=255)
-        self.draw.text((0, 30), f"V3 :{v3.get('voltage',0):4.2f}V", font=self.font, fill=255)
-        self.draw.text((0, 40), f"I3 :{v3.get('current',0):4.2f}A", font=self.font, fill=255)
-        self._update()
+    def _rail(self, title, group, fb, d):
+        g = d.get(group) or {}
+        if not g.get("isAvailable", True):
+            self._title(fb, title)
+            fb.text(0, 10, "n/a")
+            return
+        self._title(fb, title, f"{g.get('power', 0):.1f}W")
+        fb.text(0, 10, f"{g.get('voltage', 0):.2f}V")
+        fb.text(0, 20, f"{g.get('current', 0):.3f}A")
+        fb.sparkline(0, 32, self.WIDTH, 16, self.history[f"{group}.current"])
+
+    def _temps(self, fb, d):
+        self._title(fb, "Temp")
+        for y, n in ((10, 1), (20, 2)):
+            g = d.get(f"temperatureSensor{n}") or {}
+            if g.get("isAvailable", True):
+                fb.text(0, y, f"{n} {g.get('temperature', 0):.1f}C {g.get('humidity', 0):.0f}%")
+            else:
+                fb.text(0, y, f"{n} n/a")
+        fb.sparkline(0, 32, self.WIDTH, 16, self.history["temperatureSensor1.temperature"])
+
+    def _pi(self, fb, d):
+        temp = self.pi.get("cpu_temp")
+        self._title(fb, "Pi", f"{temp:.0f}C" if temp is not None else "")
+        fb.text(0, 10, f"CPU {self.pi.get('cpu_usage') or 0:.1f}%")
+        if self.pi.get("mem_used") is not None:
+            fb.text(0, 20, f"RAM {self.pi['mem_used']}M")
+        fb.sparkline(0, 32, self.WIDTH, 16, self.history["pi.cpu"])
 
 # ---------------------------------------------------------------------------
 # Entry‑points
@@ -126,18 +242,21 @@ class OLED:
 def _listener(q):
     global _teency_data
     while True:
-        try:
-            pkt = q.get(timeout=1)
+        for pkt in receive(q):
             if pkt.get("type") == "telemetry":
                 _teency_data = pkt
-        except queue.Empty:
-            continue
 
 
 def run(q):
     """Вызывается orchestrator'ом main.py"""
+    global _store
     oled = OLED()
-    threading.Thread(target=_listener, args=(q,), daemon=True).start()
+    _store = FrameStore.attach()
+    oled.warm_start()
+    if _store is None and q is not None:
+        threading.Thread(target=_listener, args=(q,), daemon=True).start()
+    metrics.start_exporter("oled_small")
+    drivers.ready("oled_small")
 
     def _cleanup(signum, frame):  # pragma: no cover - hardware cleanup
         oled.poweroff()
@@ -154,13 +273,12 @@ def run(q):
 
 def main():
     """Standalone запуск на ПК/PI без очереди."""
-    from multiprocessing import Queue
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s %(name)s %(levelname)s: %(message)s",
         handlers=[RotatingFileHandler("system.log", maxBytes=1_000_000, backupCount=5)],
     )
-    run(Queue())
+    run(TelemetryBus().subscribe("oled_small"))
 
 
 if __name__ == "__main__":
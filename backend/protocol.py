@@ -0,0 +1,210 @@
+"""Teensy serial protocol: JSON lines or COBS framed binary records.
+
+Binary frame on the wire::
+
+    COBS(type:u8 | body | crc16:u16le) 0x00
+
+``crc16`` is CRC-16/CCITT-FALSE over ``type | body``.  A telemetry body is the
+packed ``Telemetry`` record from ``frame.py`` (77 bytes), so a whole frame is
+~82 bytes instead of ~600 bytes of JSON.  Frames are shorter than 122 bytes,
+which keeps the COBS code byte below ``{`` and lets ``Decoder`` tell the two
+formats apart by the first byte of each frame.
+
+Commands go the other way in the same framing (``encode_command``)::
+
+    COMMAND  seq:u16 | op:u8 | args       host -> Teensy
+    ACK      seq:u16 | status:u8 | value:u32   Teensy -> host
+
+The Teensy answers every command with an ack carrying its ``seq``; ``value``
+is the result (``millis()`` for a ping, the relay state, the poll interval).
+Acks are binary frames even when telemetry is sent as JSON lines.
+"""
+
+import binascii
+import json
+import logging
+import struct
+from typing import Any, Dict, List
+
+from . import frame
+
+log = logging.getLogger(__name__)
+
+FRAME_TELEMETRY = 0x01
+FRAME_COMMAND = 0x02
+FRAME_ACK = 0x03
+
+CMD_PING = 0x01
+CMD_SET_RELAY = 0x02      # relay:u8 (1 or 2), on:u8
+CMD_SET_POLL = 0x03       # interval_ms:u16
+
+ACK_OK = 0
+ACK_BAD_COMMAND = 1
+ACK_BAD_ARGS = 2
+ACK_BUSY = 3              # relay change dropped by the firmware's 20 ms debounce
+
+COMMAND = struct.Struct("<HB")
+ACK = struct.Struct("<HBI")
+
+MAX_BINARY = 254          # longer runs without a delimiter are garbage
+_TEXT = bytes(range(0x20, 0x7F)) + b"\r"
+
+
+def crc16(data) -> int:
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def cobs_encode(data: bytes) -> bytes:
+    out = bytearray()
+    for block in bytes(data).split(b"\x00"):
+        while len(block) >= 254:
+            out.append(255)
+            out += block[:254]
+            block = block[254:]
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+
+def cobs_decode(data) -> bytes:
+    out = bytearray()
+    i, n = 0, len(data)
+    while i < n:
+        code = data[i]
+        if code == 0 or i + code > n:
+            raise ValueError("bad COBS block")
+        out += data[i + 1:i + code]
+        i += code
+        if code < 255 and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def encode(ftype: int, body: bytes) -> bytes:
+    """Build a complete binary frame including the trailing delimiter."""
+    payload = bytes([ftype]) + body
+    return cobs_encode(payload + crc16(payload).to_bytes(2, "little")) + b"\x00"
+
+
+def encode_telemetry(pkt: Dict[str, Any]) -> bytes:
+    return encode(FRAME_TELEMETRY, frame.pack(pkt))
+
+
+def encode_command(seq: int, op: int, args: bytes = b"") -> bytes:
+    return encode(FRAME_COMMAND, COMMAND.pack(seq, op) + args)
+
+
+def encode_ack(seq: int, status: int, value: int = 0) -> bytes:
+    return encode(FRAME_ACK, ACK.pack(seq, status, value & 0xFFFFFFFF))
+
+
+class Decoder:
+    """Incremental splitter for a mixed JSON / binary byte stream.
+
+    ``feed`` appends to one reusable buffer and returns every complete packet.
+    ``mode`` is the format of the last good telemetry frame.  A printable fragment
+    without a leading ``{`` (joining mid-line) is skipped up to its newline;
+    binary frames are only ever cut at the zero delimiter.  A COBS code byte may
+    be 0x0A or 0x0D, so CR/LF is only skipped as a blank line after a text line
+    and when it does not start a valid frame.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._line = None           # last frame was a text line; None: none yet
+        self.mode = None
+        self.errors = 0
+
+    def feed(self, data) -> List[Dict[str, Any]]:
+        buf = self._buf
+        buf += data
+        out = []
+        start, n = 0, len(buf)
+        while start < n:
+            if buf[start] == 0x7B:                       # "{"
+                end = buf.find(b"\n", start)
+                if end < 0:
+                    break
+                pkt = self._json(buf[start:end])
+                self._line = True
+            elif buf[start] == 0:
+                start += 1
+                continue
+            else:
+                end = buf.find(b"\x00", start)
+                if self._line and buf[start] in b"\r\n":
+                    noise = self._noise(buf, start, end)
+                    if noise is None:
+                        break                           # blank line or frame: wait
+                    if noise:
+                        start += 1
+                        continue
+                if end < 0:
+                    nl = buf.find(b"\n", start)
+                    if (nl >= 0 and self._line is not False
+                            and not buf[start:nl].translate(None, _TEXT)):
+                        start = nl + 1                  # tail of a JSON line
+                        self._line = True
+                        continue
+                    if n - start > MAX_BINARY:
+                        self.errors += 1
+                        start = n
+                    break
+                pkt = self._binary(buf[start:end])
+                self._line = False
+            start = end + 1
+            if pkt is not None:
+                out.append(pkt)
+        del buf[:start]
+        return out
+
+    def _noise(self, buf, start, end):
+        """Whether CR/LF at ``start`` is a blank line rather than a code byte.
+
+        A frame must pass its CRC; ``None`` while neither has fully arrived.
+        """
+        if end >= 0:
+            try:
+                payload = cobs_decode(buf[start:end])
+            except ValueError:
+                return True
+            return len(payload) < 3 or crc16(payload[:-2]) != int.from_bytes(payload[-2:], "little")
+        if len(buf) - start > MAX_BINARY:
+            return True
+        rest = bytes(buf[start:]).lstrip(b"\r\n")
+        return True if rest.startswith(b"{") and b"\n" in rest else None
+
+    def _json(self, line):
+        try:
+            pkt = {"type": "telemetry", **json.loads(line)}
+        except (ValueError, TypeError) as e:
+            self._error("bad JSON frame: %s", e)
+            return None
+        self.mode = "json"
+        return pkt
+
+    def _binary(self, raw):
+        try:
+            payload = cobs_decode(raw)
+        except ValueError as e:
+            self._error("%s", e)
+            return None
+        if len(payload) < 3 or crc16(payload[:-2]) != int.from_bytes(payload[-2:], "little"):
+            self._error("bad CRC in %d byte frame", len(payload))
+            return None
+        if payload[0] == FRAME_TELEMETRY and len(payload) == frame.SIZE + 3:
+            self.mode = "binary"
+            return {"type": "telemetry", **frame.unpack(payload, 1)}
+        if payload[0] == FRAME_ACK and len(payload) == ACK.size + 3:
+            seq, status, value = ACK.unpack_from(payload, 1)
+            return {"type": "ack", "seq": seq, "status": status, "value": value}
+        if payload[0] == FRAME_COMMAND and len(payload) >= COMMAND.size + 3:
+            seq, op = COMMAND.unpack_from(payload, 1)
+            return {"type": "command", "seq": seq, "op": op,
+                    "args": bytes(payload[1 + COMMAND.size:-2])}
+        self._error("unknown frame type 0x%02X", payload[0])
+        return None
+
+    def _error(self, msg, *args):
+        self.errors += 1
+        log.debug(msg, *args)
@@ -0,0 +1,122 @@
+"""Columnar ring buffer of recent telemetry for vectorized window stats.
+
+Every ``frame.FIELDS`` entry except ``ts`` is a row of one preallocated
+float32 matrix, so a column is contiguous and a batch of frames is written
+with a single slice assignment.  Host receive time and Teensy ``ts`` have
+their own float64 / uint32 columns.  Needs NumPy; check ``available()``.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from . import frame
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np
+except Exception as e:  # pragma: no cover
+    np = None
+    logging.warning("numpy not available, no telemetry ring: %s", e)
+
+CAPACITY = 60_000        # 10 min at 100 Hz
+MAX_GAP = 1.0            # s; longer gaps between frames add no energy
+PERCENTILES = (50, 95, 99)
+
+FIELDS = tuple(f for f in frame.FIELDS if f != "ts")
+_TS = frame.FIELDS.index("ts")
+_IDX = {f: i for i, f in enumerate(FIELDS)}
+
+
+def available() -> bool:
+    return np is not None
+
+
+class TelemetryRing:
+    """Last ``capacity`` frames, oldest overwritten first."""
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)       # host rx, epoch s
+        self.ts = np.zeros(capacity, dtype=np.uint32)       # Teensy millis()
+        self.data = np.zeros((len(FIELDS), capacity), dtype=np.float32)
+        self.head = 0            # next slot to write
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, pkts: Iterable[Dict[str, Any]]) -> None:
+        """Add a batch of decoded frames, as delivered by the bus."""
+        pkts = list(pkts)[-self.capacity:]
+        if not pkts:
+            return
+        t = np.array([p.get("rx", 0.0) for p in pkts], dtype=np.float64)
+        block = np.array([frame.values(p) for p in pkts], dtype=np.float64)
+        ts = block[:, _TS].astype(np.uint32)
+        cols = np.delete(block, _TS, axis=1).T
+        n = len(pkts)
+        with self._lock:
+            first = min(n, self.capacity - self.head)
+            for dst, src in ((slice(self.head, self.head + first), slice(0, first)),
+                             (slice(0, n - first), slice(first, n))):
+                self.t[dst] = t[src]
+                self.ts[dst] = ts[src]
+                self.data[:, dst] = cols[:, src]
+            self.head = (self.head + n) % self.capacity
+            self.count = min(self.count + n, self.capacity)
+
+    def _ordered(self, col):
+        """Filled part of a column, oldest first."""
+        if self.count < self.capacity:
+            return col[..., :self.count]
+        return np.concatenate((col[..., self.head:], col[..., :self.head]), axis=-1)
+
+    def window(self, field: str, seconds: Optional[float] = None, _ts: bool = False):
+        """``(t, values)`` of ``field`` for the last ``seconds`` (all if None)."""
+        with self._lock:
+            t = self._ordered(self.t).copy()
+            v = self._ordered(self.data[_IDX[field]]).copy()
+            ts = self._ordered(self.ts).copy() if _ts else None
+        if seconds is not None and len(t):
+            start = np.searchsorted(t, t[-1] - seconds)
+            t, v = t[start:], v[start:]
+            if _ts:
+                ts = ts[start:]
+        return (t, v, ts) if _ts else (t, v)
+
+    def stats(self, field: str, seconds: Optional[float] = None) -> Dict[str, Any]:
+        t, v = self.window(field, seconds)
+        if not len(v):
+            return {"field": field, "count": 0}
+        pct = np.percentile(v, PERCENTILES)
+        out = {
+            "field": field,
+            "count": int(len(v)),
+            "span": float(t[-1] - t[0]),
+            "mean": float(v.mean()),
+            "std": float(v.std()),
+            "min": float(v.min()),
+            "max": float(v.max()),
+            **{f"p{p}": float(x) for p, x in zip(PERCENTILES, pct)},
+        }
+        if field.endswith(".power"):
+            out["energy_wh"] = self.energy(field, seconds)
+        return out
+
+    def energy(self, field: str, seconds: Optional[float] = None) -> float:
+        """Trapezoidal integral of a ``.power`` column in Wh.
+
+        Uses the Teensy ``ts`` for dt (wraps at 2**32 ms) when the firmware
+        sends it, otherwise host receive time.
+        """
+        t, p, ts = self.window(field, seconds, _ts=True)
+        if len(p) < 2:
+            return 0.0
+        if ts.any():
+            dt = (np.diff(ts.astype(np.int64)) % (1 << 32)) / 1000.0
+        else:
+            dt = np.diff(t)
+        dt[dt > MAX_GAP] = 0.0
+        p = p.astype(np.float64)
+        return float(((p[:-1] + p[1:]) * 0.5 * dt).sum() / 3600.0)
@@ -0,0 +1,73 @@
+"""Background sampling of the Pi-side sensors into a TTL cache.
+
+Each sensor is read by its own daemon thread at its native cadence, so a
+slow DS18B20 conversion or a DHT11 retry never holds up another sensor or an
+HTTP request.  Handlers only look at the cache.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+MAX_BACKOFF = 30.0      # s between attempts on a sensor that keeps failing
+RETRIES = 3             # failures retried at the normal period before backing off
+
+
+class _Entry:
+    def __init__(self, read: Callable[[], Any], period: float, ttl: float):
+        self.read = read
+        self.period = period
+        self.ttl = ttl
+        self.value = None
+        self.stamp = 0.0
+
+
+class SensorCache:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._started = False
+
+    def add(self, name: str, read: Callable[[], Any], period: float,
+            ttl: Optional[float] = None) -> None:
+        """Sample ``read()`` every ``period`` s; values expire after ``ttl``.
+
+        The default ``ttl`` outlasts ``RETRIES`` failed reads in a row, which
+        are routine for a DHT11.
+        """
+        self._entries[name] = _Entry(read, period, ttl or (RETRIES + 2) * period)
+
+    def get(self, name: str):
+        """Last good reading of ``name`` or ``None`` if missing or expired."""
+        e = self._entries[name]
+        if time.monotonic() - e.stamp > e.ttl:
+            return None
+        return e.value
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for name, e in self._entries.items():
+            threading.Thread(target=self._run, args=(name, e), daemon=True,
+                             name=f"sensor-{name}").start()
+
+    def _run(self, name: str, e: _Entry) -> None:
+        delay, failures = e.period, 0
+        while True:
+            start = time.monotonic()
+            try:
+                value = e.read()
+            except Exception as ex:  # pragma: no cover - hardware error
+                log.info("%s read failed: %s", name, ex)
+                value = None
+            if value is not None:
+                e.value, e.stamp = value, time.monotonic()
+                delay, failures = e.period, 0
+            else:
+                failures += 1
+                if failures > RETRIES:
+                    delay = min(delay * 2, max(MAX_BACKOFF, e.period))
+            time.sleep(max(0.0, delay - (time.monotonic() - start)))
@@ -0,0 +1,98 @@
+"""Production serving of the web API: waitress, gzip and static caching.
+
+waitress runs the app on a thread pool; each open ``/api/stream`` holds a
+thread that mostly sleeps in ``StreamHub.wait``, so the pool is large and the
+thread stacks are small (~13 KB RSS per idle stream).  Streams are still not
+free: every one takes a pool thread for as long as it is open, so they are
+capped at ``MAX_STREAMS`` and the rest of the pool stays free for REST
+requests; further clients get 503 and poll instead.  Without waitress the
+threaded Werkzeug server is used.
+"""
+
+import functools
+import gzip
+import logging
+import os
+import threading
+
+from flask import Flask, request
+
+try:  # pragma: no cover - optional dependency
+    import waitress
+except Exception as e:  # pragma: no cover
+    waitress = None
+    logging.warning("waitress not available, using the Flask dev server: %s", e)
+
+log = logging.getLogger(__name__)
+
+HOST = "0.0.0.0"
+PORT = int(os.environ.get("HTTP_PORT", 8000))
+THREADS = 200            # requests + open streams served at once
+MAX_STREAMS = 150        # open /api/stream; the other threads serve REST
+STACK_SIZE = 256 * 1024  # per worker thread, mostly untouched
+CONNECTIONS = 250
+
+GZIP_MIN = 512           # bytes; smaller bodies are sent as they are
+GZIP_LEVEL = 5
+GZIP_TYPES = ("application/json", "text/html", "text/plain", "text/css",
+              "application/javascript", "text/javascript")
+STATIC_MAX_AGE = 365 * 24 * 3600   # static URLs carry ?v=<mtime>
+
+
+def setup(app: Flask) -> None:
+    """gzip for dynamic responses and long-lived, versioned static URLs."""
+    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = STATIC_MAX_AGE
+
+    @functools.lru_cache(maxsize=None)
+    def version(filename: str) -> int:
+        try:
+            return int(os.stat(os.path.join(app.static_folder, filename)).st_mtime)
+        except OSError:
+            return 0
+
+    @app.url_defaults
+    def _static_version(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values.setdefault("v", version(values["filename"]))
+
+    @app.after_request
+    def _gzip(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in GZIP_TYPES
+                or "gzip" not in request.headers.get("Accept-Encoding", "")):
+            return response
+        data = response.get_data()
+        if len(data) < GZIP_MIN:
+            return response
+        response.set_data(gzip.compress(data, GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+def create_server(app: Flask, host: str = HOST, port: int = PORT):
+    """waitress server for ``app`` (``.run()``, ``.close()``) or ``None``."""
+    if waitress is None:
+        return None
+    threading.stack_size(STACK_SIZE)
+    from waitress.server import create_server as _create
+    return _create(
+        app, host=host, port=port, threads=THREADS,
+        connection_limit=CONNECTIONS,
+        asyncore_use_poll=True,     # no select() limit on open sockets
+        ident="burning-control",
+    )
+
+
+def serve(app: Flask, host: str = HOST, port: int = PORT) -> None:
+    server = create_server(app, host, port)
+    if server is None:
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+    log.info("serving on http://%s:%d with %d threads", host, port, THREADS)
+    try:
+        server.run()
+    finally:
+        server.close()
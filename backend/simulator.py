@@ -0,0 +1,290 @@
+"""Teensy simulator: synthetic or replayed telemetry on a pseudo-terminal.
+
+Run it and point the reader at the printed port (or ``--link``)::
+
+    python -m backend.simulator --rate 100 --link /tmp/ttyTEENSY
+    TEENSY_PORT=/tmp/ttyTEENSY python main.py
+
+``--replay telemetry.log.*.gz ...`` plays logged frames instead (plain or
+compressed, see ``telemetry_log.py``), with their recorded timing when the
+lines carry ``rx``; ``--speed`` scales time and ``--speed 0`` sends as fast
+as the reader takes it.
+
+Commands from the reader (``commands.py``) are answered like the firmware
+does: relays switch and show up in the following frames, a new poll
+interval is acknowledged but does not change the frame rate.
+
+``--measure`` starts its own ``teensy_reader`` on the pty with a probe
+subscriber and reports throughput, dropped frames and latency, plus the
+round trip of pings sent through ``CommandClient`` meanwhile.  Every frame
+then carries ``ts`` = the send time in ms of ``time.monotonic()``.  Don't
+use it next to a running ``main.py``: the reader would write the shared
+frame store.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import select
+import signal
+import struct
+import time
+import tty
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import frame
+from .protocol import (ACK_BAD_ARGS, ACK_BAD_COMMAND, ACK_BUSY, ACK_OK, CMD_PING,
+                       CMD_SET_POLL, CMD_SET_RELAY, Decoder, encode_ack, encode_telemetry)
+from .telemetry_log import read_lines
+
+TICK = 0.005             # s between writes; due frames go out together
+RELAY_DEBOUNCE = 0.02    # s; like setRelay() in the firmware
+_MASK = 0xFFFFFFFF
+
+
+def synthetic(rate: float) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Endless ``(t, pkt)`` with plausible values, ``t`` relative in s."""
+    for i in itertools.count():
+        t = i / rate
+        load = 0.5 + 0.4 * math.sin(t / 7) + random.gauss(0, 0.02)
+        pkt: Dict[str, Any] = {"type": "telemetry", "ts": int(t * 1000) & _MASK}
+        for s, v in zip(frame.VOLTAGE_SENSORS, (3.3, 5.0, 5.0, 24.0)):
+            volt = v - 0.05 * load + random.gauss(0, 0.003)
+            cur = max(0.0, load * (2.0 if v > 20 else 0.8) + random.gauss(0, 0.005))
+            pkt[s] = {"current": round(cur, 3), "voltage": round(volt, 3),
+                      "power": round(cur * volt, 3), "isAvailable": True}
+        for n, s in enumerate(frame.TEMP_SENSORS):
+            pkt[s] = {"temperature": round(30 + 5 * load + n + random.gauss(0, 0.1), 1),
+                      "humidity": round(40 + random.gauss(0, 0.3), 1), "isAvailable": True}
+        pkt.update(relay1=True, relay2=False, button=False)
+        yield t, pkt
+
+
+def replay(paths: List[str]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """``(t, pkt)`` from logger files, old JSON-only lines or ``asctime {json}``.
+
+    Compressed logs are read through ``telemetry_log.read_lines``.
+    """
+    t0: Optional[float] = None
+    step = 0.0
+    for path in paths:
+        for line in read_lines(path):
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                pkt = json.loads(line[start:])
+            except ValueError:
+                continue
+            if pkt.get("type") != "telemetry":
+                continue
+            rx = pkt.pop("rx", None)
+            if rx is None:          # no timing recorded: 10 Hz
+                step += 0.1
+                yield step, pkt
+                continue
+            if t0 is None:
+                t0 = rx - step
+            step = rx - t0
+            yield step, pkt
+
+
+def open_pty(link: Optional[str] = None) -> Tuple[int, int, str]:
+    """``(master, slave, port)``; the slave stays open so writes never fail."""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    port = os.ttyname(slave)
+    if link:
+        try:
+            os.unlink(link)
+        except FileNotFoundError:
+            pass
+        os.symlink(port, link)
+        port = link
+    return master, slave, port
+
+
+class _Teensy:
+    """Answers the commands the reader writes to the pty."""
+
+    def __init__(self):
+        self.dec = Decoder()
+        self.relays = {1: False, 2: False}
+        self.changed = {1: -1.0, 2: -1.0}     # monotonic time of the last switch
+        self.interval = 100
+        self.start = time.monotonic()
+
+    def answer(self, fd: int) -> bytes:
+        """Acks for the commands waiting on ``fd``, without blocking."""
+        if not select.select([fd], [], [], 0)[0]:
+            return b""
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            return b""
+        return b"".join(self._handle(c) for c in self.dec.feed(data) if c["type"] == "command")
+
+    def _handle(self, cmd: Dict[str, Any]) -> bytes:
+        op, args = cmd["op"], cmd["args"]
+        if op == CMD_PING:
+            return encode_ack(cmd["seq"], ACK_OK, int((time.monotonic() - self.start) * 1000))
+        if op == CMD_SET_RELAY and len(args) == 2 and args[0] in self.relays:
+            relay, on, now = args[0], bool(args[1]), time.monotonic()
+            if on != self.relays[relay]:
+                if now - self.changed[relay] < RELAY_DEBOUNCE:
+                    return encode_ack(cmd["seq"], ACK_BUSY, int(self.relays[relay]))
+                self.relays[relay], self.changed[relay] = on, now
+            return encode_ack(cmd["seq"], ACK_OK, int(on))
+        if op == CMD_SET_POLL and len(args) == 2:
+            self.interval = struct.unpack("<H", args)[0]
+            return encode_ack(cmd["seq"], ACK_OK, self.interval)
+        if op in (CMD_SET_RELAY, CMD_SET_POLL):
+            return encode_ack(cmd["seq"], ACK_BAD_ARGS)
+        return encode_ack(cmd["seq"], ACK_BAD_COMMAND)
+
+
+def send(fd: int, frames: Iterator[Tuple[float, Dict[str, Any]]], speed: float,
+         fmt: str, duration: Optional[float], stamp: bool) -> Dict[str, float]:
+    """Write ``frames`` to ``fd`` on their schedule; returns send stats."""
+    encode = encode_telemetry if fmt == "binary" else (
+        lambda p: json.dumps(p, separators=(",", ":")).encode() + b"\n")
+    sent = blocked = 0
+    nbytes = 0
+    teensy = _Teensy()
+    start = time.monotonic()
+    frames = iter(frames)
+    pending = next(frames, None)
+    while pending is not None:
+        now = time.monotonic() - start
+        if duration is not None and now >= duration:
+            break
+        buf = bytearray(teensy.answer(fd))
+        while pending is not None and (speed == 0 or pending[0] / speed <= now):
+            pkt = pending[1]
+            pkt.update(relay1=teensy.relays[1], relay2=teensy.relays[2])
+            if stamp:
+                pkt["ts"] = int(time.monotonic() * 1000) & _MASK
+            buf += encode(pkt)
+            sent += 1
+            pending = next(frames, None)
+            if speed == 0 and len(buf) >= 4096:
+                break
+        if buf:
+            os.write(fd, buf)
+            nbytes += len(buf)
+            if time.monotonic() - start - now > TICK:
+                blocked += 1        # pty full: the reader is not keeping up
+        if speed and pending is not None:   # sleep, but wake up for commands
+            select.select([fd], [], [], max(0.0, min(TICK, pending[0] / speed
+                                                      - (time.monotonic() - start))))
+    elapsed = time.monotonic() - start
+    return {"sent": sent, "bytes": nbytes, "seconds": elapsed, "blocked_writes": blocked}
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def measure(frames, speed: float, fmt: str, duration: float) -> Dict[str, Any]:
+    """Drive a real reader over a pty and collect what a subscriber sees."""
+    import tempfile
+    import threading
+    from multiprocessing import Process
+
+    from . import commands, teensy_reader
+    from .bus import TelemetryBus, receive
+
+    master, slave, port = open_pty()
+    teensy_reader.PORTS = [port]
+    commands.SOCKET = os.path.join(tempfile.mkdtemp(), "cmd.sock")   # not main.py's
+    bus = TelemetryBus()
+    conn = bus.subscribe("probe")
+    reader = Process(target=teensy_reader.run, args=(bus,), name="reader", daemon=True)
+    reader.start()
+    time.sleep(0.5)                 # let it open the port
+    got: List[float] = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            pkts = receive(conn, 0.1)
+            now = int(time.monotonic() * 1000)
+            got.extend(((now - p.get("ts", 0)) & _MASK) for p in pkts)
+
+    rtts: List[float] = []
+    failed = 0
+    until = time.monotonic() + duration - 1.0   # all pings answered before the end
+
+    def ping():
+        nonlocal failed
+        client = commands.CommandClient()
+        while time.monotonic() < until:
+            time.sleep(0.05)
+            res = client.ping()
+            if res.get("ok"):
+                rtts.append(res["rtt_ms"])
+            else:
+                failed += 1
+
+    threads = [threading.Thread(target=probe, daemon=True),
+               threading.Thread(target=ping, daemon=True)]
+    for t in threads:
+        t.start()
+    stats = send(master, frames, speed, fmt, duration, stamp=True)
+    time.sleep(1.0)                 # drain
+    done.set()
+    for t in threads:
+        t.join()
+    reader.terminate()
+    reader.join()
+    os.close(master)
+    os.close(slave)
+    received = len(got)
+    return {**stats, "received": received, "dropped": stats["sent"] - received,
+            "fps": round(received / stats["seconds"], 1) if stats["seconds"] else 0.0,
+            "latency_ms": {"p50": _percentile(got, 50), "p95": _percentile(got, 95),
+                           "p99": _percentile(got, 99), "max": max(got, default=0)},
+            "command_rtt_ms": {"p50": _percentile(rtts, 50), "p99": _percentile(rtts, 99),
+                               "max": max(rtts, default=0), "failed": failed}}
+
+
+def _stop(signum, frame):
+    raise SystemExit
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--replay", nargs="+", metavar="LOG", help="telemetry.log* files to play")
+    ap.add_argument("--rate", type=float, default=100.0, help="synthetic frames/s")
+    ap.add_argument("--speed", type=float, default=1.0, help="time scale, 0 = unthrottled")
+    ap.add_argument("--format", choices=("json", "binary"), default="json")
+    ap.add_argument("--duration", type=float, help="stop after this many s")
+    ap.add_argument("--link", help="symlink to the pty, e.g. /tmp/ttyTEENSY")
+    ap.add_argument("--measure", action="store_true",
+                    help="run a reader on the pty and report what it delivers")
+    args = ap.parse_args(argv)
+
+    frames = replay(args.replay) if args.replay else synthetic(args.rate)
+    if args.measure:
+        print(json.dumps(measure(frames, args.speed, args.format, args.duration or 10.0),
+                         indent=2))
+        return
+    master, slave, port = open_pty(args.link)
+    print(f"simulating Teensy on {port}", flush=True)
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        stats = send(master, frames, args.speed, args.format, args.duration, stamp=False)
+        print(json.dumps(stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link:
+            os.unlink(args.link)
+
+
+if __name__ == "__main__":
+    main()
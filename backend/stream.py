@@ -0,0 +1,71 @@
+"""Server-Sent Events fan-out for the web API.
+
+Producers call ``StreamHub.publish`` with the newest value of an event; it is
+JSON encoded once and every connected client picks it up.  Clients always get
+the latest value, so a client throttled with ``interval`` skips intermediate
+frames instead of queueing them.
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+KEEPALIVE = 15.0        # s between comments on an idle stream
+
+
+class StreamHub:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._events = {}       # event -> (seq, encoded data)
+        self.clients = 0
+
+    def publish(self, event: str, payload) -> None:
+        data = json.dumps(payload, separators=(",", ":"))
+        with self._cond:
+            self._seq += 1
+            self._events[event] = (self._seq, data)
+            self._cond.notify_all()
+
+    def wait(self, last: int, timeout: float):
+        """Return ``(seq, [(event, data), ...])`` for events newer than ``last``."""
+        with self._cond:
+            if self._seq <= last:
+                self._cond.wait(timeout)
+            items = [(e, d) for e, (s, d) in self._events.items() if s > last]
+            return self._seq, items
+
+    def stream(self, events: Iterable[str], interval: float = 0.0,
+               encoders: Optional[Dict[str, Callable]] = None) -> Iterator[str]:
+        """SSE body for one client; ``interval`` is the minimum gap in s.
+
+        ``encoders`` replaces the shared data of an event with a per-client
+        payload: it gets the shared data and returns a string or ``None`` to
+        send nothing.
+        """
+        events = set(events)
+        encoders = encoders or {}
+        last = 0
+        with self._cond:
+            self.clients += 1
+        try:
+            yield "retry: 2000\n\n"
+            sent = time.monotonic()
+            while True:
+                last, items = self.wait(last, KEEPALIVE)
+                items = [(e, encoders[e](d) if e in encoders else d)
+                         for e, d in items if e in events]
+                items = [(e, d) for e, d in items if d is not None]
+                if not items:
+                    if time.monotonic() - sent >= KEEPALIVE:
+                        sent = time.monotonic()
+                        yield ": keepalive\n\n"
+                    continue
+                sent = time.monotonic()
+                yield "".join(f"event: {e}\ndata: {d}\n\n" for e, d in items)
+                if interval:
+                    time.sleep(interval)
+        finally:
+            with self._cond:
+                self.clients -= 1
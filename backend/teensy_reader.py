@@ -1,34 +1,116 @@
-import json, logging, time, queue
+import logging, os, time
 try:
     import serial
 except ImportError:
     serial = None
+from . import drivers, metrics
+from .commands import Dispatcher, serve as serve_commands
+from .frame_store import FrameHistory, FrameStore
+from .protocol import Decoder
 
-PORTS   = ["/dev/ttyACM0", "/dev/ttyUSB0"]
+# TEENSY_PORT=/tmp/ttyTEENSY (comma separated) e.g. for backend.simulator
+PORTS   = [p for p in os.environ.get("TEENSY_PORT", "").split(",") if p] \
+          or ["/dev/ttyACM0", "/dev/ttyUSB0"]
 BAUD    = 115200
 LOG     = logging.getLogger("reader")
 
+READ_WAIT   = 0.02          # s to wait for the first byte of a batch
+BACKOFF     = (0.05, 2.0)   # reconnect delay: first, max (doubles per failure)
+
+_parse   = metrics.histogram("reader_parse_seconds", "Decoder time per serial chunk")
+_delay   = metrics.histogram("reader_serial_delay_seconds",
+                             "rx minus Teensy ts above the smallest offset seen")
+_frames  = metrics.counter("reader_frames_total", "Frames decoded")
+_bytes   = metrics.counter("reader_bytes_total", "Serial bytes read")
+_errors  = metrics.counter("reader_errors_total", "Frames rejected by the decoder")
+_resets  = metrics.counter("reader_reconnects_total", "Serial port reopened")
+
+class _SerialDelay:
+    """USB / UART delay of a frame: ``rx - ts`` minus its minimum.
+
+    The clocks are unrelated, so the offset is the smallest ``rx - ts`` of
+    the last one to two minutes, which follows drift; it starts over when
+    ``ts`` goes back (Teensy restart or wrap).
+    """
+    WINDOW = 60.0
+
+    def __init__(self):
+        self.low = self.prev = float("inf")
+        self.since = self.ts = 0.0
+
+    def observe(self, pkts, rx):
+        if rx - self.since > self.WINDOW:
+            self.prev, self.low, self.since = self.low, float("inf"), rx
+        for pkt in pkts:
+            ts = pkt.get("ts")
+            if not ts: return
+            if ts < self.ts: self.low = self.prev = float("inf")
+            self.ts = ts
+            off = rx - ts / 1000
+            if off < self.low: self.low = off
+            _delay.observe(off - min(self.low, self.prev))
+
 def _open():
     for p in PORTS:
-        try: return serial.Serial(p, BAUD, timeout=1)
+        try: return serial.Serial(p, BAUD, timeout=READ_WAIT)
         except Exception: LOG.info("no %s", p)
     return None
 
-def run(q):
-    ser = None
+def _drain(ser) -> bytes:
+    """Everything the driver has buffered, waiting at most READ_WAIT for it."""
+    chunk = ser.read(ser.in_waiting or 1)
+    if chunk and ser.in_waiting:
+        chunk += ser.read(ser.in_waiting)
+    return chunk
+
+def run(bus):
+    store = FrameStore.attach()     # latest frame for the OLED and web API
+    hist  = FrameHistory.attach()   # recent frames for restarted workers
+    lag   = _SerialDelay()
+    metrics.start_exporter("reader")
+    dec   = Decoder()               # JSON lines or binary frames, see protocol.py
+    cmds  = Dispatcher()            # commands share the port, see commands.py
+    serve_commands(cmds)
+    drivers.ready("reader")
+    ser   = None
+    delay = BACKOFF[0]
     while True:
         if serial is None: time.sleep(1); continue
-        if ser is None: ser = _open(); time.sleep(1); continue
+        if ser is None:
+            ser = _open()
+            if ser is None:
+                time.sleep(delay); delay = min(delay * 2, BACKOFF[1]); continue
+            LOG.info("serial open %s", ser.port)
+            cmds.attach(ser)
+            delay = BACKOFF[0]
 
         try:
-            line = ser.readline().decode("utf-8","ignore").strip()
-            if not line: continue
-            pkt  = {"type":"telemetry", **json.loads(line)}
-            try: q.put_nowait(pkt)
-            except queue.Full: LOG.warning("drop pkt")
+            chunk = _drain(ser)
+            cmds.expire()
+            if not chunk: continue
+            rx   = time.time()
+            errs = dec.errors
+            with _parse.time():
+                pkts = dec.feed(chunk)
+            _bytes.inc(len(chunk))
+            if dec.errors != errs: _errors.inc(dec.errors - errs)
+            if any(p["type"] == "ack" for p in pkts):
+                for p in pkts:
+                    if p["type"] == "ack": cmds.on_ack(p)
+                pkts = [p for p in pkts if p["type"] == "telemetry"]
+            if not pkts: continue
+            _frames.inc(len(pkts))
+            lag.observe(pkts, rx)
+            # every frame keeps the Teensy "ts" (ms); "rx" is the host time
+            for pkt in pkts: pkt["rx"] = rx
+            if store: store.write(pkts[-1], rx)
+            if hist: hist.append(pkts, rx)
+            bus.publish(pkts)
         except Exception as e:
             LOG.warning("reset serial %s", e)
             try: ser.close()
             except Exception: pass
-            ser = None
-
+            cmds.attach(None)
+            ser, dec = None, Decoder()
+            _resets.inc()
+            time.sleep(delay)
@@ -0,0 +1,246 @@
+"""Telemetry log written in compressed blocks.
+
+Frames are buffered as the usual ``asctime {json}`` lines and written as one
+compressed block when ``FLUSH_BYTES`` have piled up or ``FLUSH_INTERVAL`` has
+passed, so the SD card sees a few large appends instead of one small write
+per frame.  Each block is a complete zstd frame (with ``zstandard``) or gzip
+member, and a file is just their concatenation: ``zcat``/``zstdcat`` read it,
+and a crash loses at most the unwritten buffer and the torn last block.
+``fsync`` runs at most every ``FSYNC_INTERVAL``.
+
+The live file is ``telemetry.log.gz`` (``.zst``); it is renamed to
+``telemetry.log.<time>.gz`` after ``MAX_BYTES`` or ``MAX_AGE`` and at
+startup, and the oldest files go once all of them exceed ``TOTAL_BYTES``.
+``read_lines`` reads any ``telemetry.log*`` file, compressed or plain.
+``TELEMETRY_LOG_CODEC=none`` writes plain text with the same batching.
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from . import metrics
+
+try:  # pragma: no cover - optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+LOG_PATH = "telemetry.log"
+CODEC = os.environ.get("TELEMETRY_LOG_CODEC") or ("zstd" if zstandard else "gzip")
+
+FLUSH_BYTES = 256 * 1024      # uncompressed buffer that triggers a block
+FLUSH_INTERVAL = 5.0          # s; longest a frame waits in memory
+FSYNC_INTERVAL = 60.0         # s between fsyncs
+MAX_BYTES = 4 * 1024 * 1024   # compressed size of one file
+MAX_AGE = 24 * 3600           # s before a file is rotated
+TOTAL_BYTES = 64 * 1024 * 1024
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+CHUNK = 64 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_EXT = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+
+_raw = metrics.counter("logger_raw_bytes_total", "Log text before compression")
+_written = metrics.counter("logger_file_bytes_total", "Bytes written to telemetry.log files")
+_fsyncs = metrics.counter("logger_fsyncs_total", "fsync calls on the telemetry log")
+_rotations = metrics.counter("logger_rotations_total", "telemetry.log files rotated")
+
+
+def _gzip_block(data: bytes) -> bytes:
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)    # 31: gzip header
+    return c.compress(data) + c.flush()
+
+
+def _compressor(codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            log.warning("zstandard not available, telemetry log uses gzip")
+            return "gzip", _gzip_block
+        return codec, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    if codec == "gzip":
+        return codec, _gzip_block
+    if codec != "none":
+        log.warning("unknown codec %r, telemetry log is plain text", codec)
+    return "none", bytes
+
+
+def _stamp(t: float) -> str:
+    """``logging``'s default asctime, e.g. ``2024-05-01 12:00:00,123``."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + ",%03d" % (t % 1 * 1000)
+
+
+class TelemetryLog:
+    """Buffered, compressed, rotating writer for the logger worker."""
+
+    def __init__(self, path: str = LOG_PATH, codec: str = CODEC):
+        self.codec, self._compress = _compressor(codec)
+        self.base = path
+        self.path = path + _EXT[self.codec]
+        self._buf = bytearray()
+        self._file = None
+        self._size = 0
+        self._opened = 0.0
+        self._flushed = self._synced = time.monotonic()
+        if os.path.exists(self.path):    # may end in a torn block: start a new file
+            self._rotate()
+        self._open()
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab", buffering=0)
+        self._size = self._file.tell()
+        self._opened = time.time()
+
+    def write(self, pkts: Iterable[Dict[str, Any]]) -> None:
+        """Buffer ``pkts``; writes a block when a trigger is due.
+
+        Call it regularly, also with no packets, so the time trigger fires.
+        """
+        rx, stamp = None, ""
+        for pkt in pkts:
+            if pkt.get("rx") != rx:      # one stamp per reader batch
+                rx = pkt.get("rx")
+                stamp = _stamp(rx or time.time())
+            self._buf += f"{stamp} {json.dumps(pkt)}\n".encode()
+        now = time.monotonic()
+        if len(self._buf) >= FLUSH_BYTES or (self._buf and now - self._flushed >= FLUSH_INTERVAL):
+            self.flush(now)
+
+    def flush(self, now: Optional[float] = None, sync: bool = False) -> None:
+        """Write the buffer as one block; fsync if due or ``sync``."""
+        now = time.monotonic() if now is None else now
+        self._flushed = now
+        if self._buf:
+            block = self._compress(bytes(self._buf))
+            _raw.inc(len(self._buf))
+            self._buf.clear()
+            self._file.write(block)
+            self._size += len(block)
+            _written.inc(len(block))
+        if sync or now - self._synced >= FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            _fsyncs.inc()
+            self._synced = now
+        if self._size >= MAX_BYTES or time.time() - self._opened >= MAX_AGE:
+            if not sync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._rotate()
+            self._open()
+
+    def _rotate(self) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        dest = f"{self.base}.{stamp}{_EXT[self.codec]}"
+        n = 1
+        while os.path.exists(dest):
+            dest = f"{self.base}.{stamp}-{n}{_EXT[self.codec]}"
+            n += 1
+        os.replace(self.path, dest)
+        _rotations.inc()
+        self._prune()
+
+    def _prune(self) -> None:
+        """Delete the oldest rotated files beyond ``TOTAL_BYTES``.
+
+        Only this writer's files count: the live one and ``<base>.<time>*``,
+        not the ``telemetry.log.N`` files of the old plain-text logger.
+        """
+        files = []
+        for p in [self.path] + glob.glob(glob.escape(self.base) + ".[0-9]*-[0-9]*"):
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in files)
+        for _, size, p in sorted(files):
+            if total <= TOTAL_BYTES:
+                break
+            if p == self.path:
+                continue
+            try:
+                os.unlink(p)
+                log.info("removed old telemetry log %s", p)
+            except OSError as e:
+                log.warning("cannot remove %s: %s", p, e)
+            total -= size
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self.flush(sync=True)
+        self._file.close()
+        self._file = None
+
+
+# -- reading ----------------------------------------------------------------
+def _gunzip(f) -> Iterator[bytes]:
+    d = zlib.decompressobj(31)
+    while True:
+        chunk = f.read(CHUNK)
+        if not chunk:
+            return
+        while chunk:
+            try:
+                yield d.decompress(chunk)
+            except zlib.error as e:
+                log.warning("%s: corrupt gzip block (%s), rest skipped", f.name, e)
+                return
+            if not d.eof:
+                break
+            chunk = d.unused_data       # next member
+            d = zlib.decompressobj(31)
+
+
+def _unzstd(f) -> Iterator[bytes]:
+    if zstandard is None:
+        log.warning("%s: zstandard not installed", f.name)
+        return
+    reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+    while True:
+        try:
+            chunk = reader.read(CHUNK)
+        except zstandard.ZstdError as e:
+            log.warning("%s: corrupt zstd block (%s), rest skipped", f.name, e)
+            return
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain(f) -> Iterator[bytes]:
+    return iter(lambda: f.read(CHUNK), b"")
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """Lines of any ``telemetry.log*`` file, decompressed by its magic bytes.
+
+    A torn block at the end (crash during a write) ends the file early, at
+    the last complete line.
+    """
+    with open(path, "rb") as f:
+        head = f.read(4)
+        f.seek(0)
+        if head.startswith(_GZIP_MAGIC):
+            chunks = _gunzip(f)
+        elif head == _ZSTD_MAGIC:
+            chunks = _unzstd(f)
+        else:
+            chunks = _plain(f)
+        rest = b""
+        for chunk in chunks:
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                yield line.decode("utf-8", "replace") + "\n"
+        if rest:                # every written line ends in "\n": this one is torn
+            log.warning("%s: incomplete last line skipped", path)
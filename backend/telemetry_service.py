@@ -1,6 +1,29 @@
+"""Raspberry Pi telemetry.
+
+``PiSampler`` reads everything once per ``SAMPLE_PERIOD`` in a background
+thread from ``/proc`` and ``/sys`` files it keeps open, and serves the last
+snapshot plus a history ring; ``get_telemetry()`` returns the snapshot of the
+process-wide sampler.  The other ``read_*`` helpers read once, for scripts.
+"""
+
+import logging
+import os
+import re
 import subprocess
 import shutil
-from typing import Optional, Tuple
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+SAMPLE_PERIOD = 1.0      # s
+HISTORY = 600            # samples in the ring, 10 min
+THROTTLED_SYSFS = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+VCGENCMD_EVERY = 10      # samples between vcgencmd calls without the sysfs file
+# get_throttled bits; the same flags << 16 mean "has occurred since boot"
+THROTTLE_FLAGS = {0: "under_voltage", 1: "freq_capped", 2: "throttled", 3: "soft_temp_limit"}
 
 
 def read_cpu_temp():
@@ -30,31 +53,9 @@ def read_cpu_freq():
         return None
 
 
-_last_cpu_times: Optional[Tuple[int, int]] = None
-
-
 def read_cpu_usage() -> Optional[float]:
-    """Return CPU usage percentage if available."""
-    global _last_cpu_times
-    try:
-        with open('/proc/stat') as f:
-            parts = f.readline().strip().split()[1:]
-            values = [int(x) for x in parts]
-        idle = values[3] + values[4]
-        total = sum(values)
-        if _last_cpu_times is None:
-            _last_cpu_times = (idle, total)
-            return None
-        last_idle, last_total = _last_cpu_times
-        _last_cpu_times = (idle, total)
-        diff_idle = idle - last_idle
-        diff_total = total - last_total
-        if diff_total == 0:
-            return None
-        usage = 100.0 * (1 - diff_idle / diff_total)
-        return round(usage, 1)
-    except Exception:
-        return None
+    """Return CPU usage percentage over the last sample period if available."""
+    return sampler().snapshot().get("cpu_usage")
 
 
 def read_memory():
@@ -81,16 +82,207 @@ def read_disk():
     return used, total
 
 
+class _File:
+    """A /proc or /sys file kept open and re-read from offset 0."""
+
+    def __init__(self, path: str):
+        try:
+            self.fd: Optional[int] = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+
+    def read(self) -> Optional[str]:
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, 65536, 0).decode()
+        except OSError:
+            return None
+
+
+def _throttle_flags(raw: int) -> Dict[str, List[str]]:
+    return {"raw": raw,
+            "now": [n for b, n in THROTTLE_FLAGS.items() if raw >> b & 1],
+            "occurred": [n for b, n in THROTTLE_FLAGS.items() if raw >> (b + 16) & 1]}
+
+
+class PiSampler:
+    """Samples Pi telemetry at a fixed rate; handlers only read ``snapshot``.
+
+    Every sampler keeps its own previous counters, so rates and CPU usage
+    don't depend on how often or by whom the snapshot is read.
+    """
+
+    def __init__(self, period: float = SAMPLE_PERIOD, history: int = HISTORY):
+        self.period = period
+        self._stat = _File("/proc/stat")
+        self._meminfo = _File("/proc/meminfo")
+        self._loadavg = _File("/proc/loadavg")
+        self._netdev = _File("/proc/net/dev")
+        self._diskstats = _File("/proc/diskstats")
+        self._temp = _File("/sys/class/thermal/thermal_zone0/temp")
+        self._freq = _File("/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq")
+        self._throttled = _File(THROTTLED_SYSFS)
+        try:
+            self._disks = {d for d in os.listdir("/sys/block")
+                           if not d.startswith(("loop", "ram", "zram"))}
+        except OSError:
+            self._disks = set()
+        self._vcgencmd = shutil.which("vcgencmd") if self._throttled.fd is None else None
+        self._prev: Optional[Tuple[float, Dict[str, Tuple[int, int]], Tuple[int, int],
+                                   Tuple[int, int]]] = None
+        self._throttle: Optional[Dict[str, Any]] = None
+        self._count = 0
+        self._snapshot: Dict[str, Any] = {}
+        self.history: deque = deque(maxlen=history)
+        self._started = False
+
+    def start(self) -> "PiSampler":
+        if not self._started:
+            self._started = True
+            self.sample()
+            threading.Thread(target=self._run, daemon=True, name="pi-sampler").start()
+        return self
+
+    def _run(self) -> None:
+        next_at = time.monotonic()
+        while True:
+            next_at += self.period
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            try:
+                self.sample()
+            except Exception as e:  # pragma: no cover - keep sampling
+                log.warning("Pi telemetry sample failed: %s", e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._snapshot
+
+    def series(self, seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """History ring, oldest first; the last ``seconds`` if given."""
+        items = list(self.history)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            items = [h for h in items if h["ts"] >= cutoff]
+        return items
+
+    # -- parsing ---------------------------------------------------------
+    def _cpu(self) -> Dict[str, Tuple[int, int]]:
+        """``{"cpu": (idle, total), "cpu0": ...}`` jiffies."""
+        out = {}
+        for line in (self._stat.read() or "").splitlines():
+            if not line.startswith("cpu"):
+                break
+            name, *vals = line.split()
+            vals = [int(v) for v in vals]
+            out[name] = (vals[3] + vals[4], sum(vals))
+        return out
+
+    def _net(self) -> Tuple[int, int]:
+        rx = tx = 0
+        for line in (self._netdev.read() or "").splitlines()[2:]:
+            iface, _, data = line.partition(":")
+            if iface.strip() == "lo":
+                continue
+            f = data.split()
+            rx += int(f[0])
+            tx += int(f[8])
+        return rx, tx
+
+    def _disk(self) -> Tuple[int, int]:
+        rd = wr = 0
+        for line in (self._diskstats.read() or "").splitlines():
+            f = line.split()
+            if len(f) > 9 and f[2] in self._disks:
+                rd += int(f[5]) * 512
+                wr += int(f[9]) * 512
+        return rd, wr
+
+    def _mem(self) -> Tuple[Optional[int], Optional[int]]:
+        info = {}
+        for line in (self._meminfo.read() or "").splitlines():
+            key, _, value = line.partition(":")
+            info[key] = int(value.split()[0])
+        if not info:
+            return None, None
+        total = info.get("MemTotal", 0) // 1024
+        available = info.get("MemAvailable", info.get("MemFree", 0)) // 1024
+        return total - available, total
+
+    def _throttling(self) -> Optional[Dict[str, Any]]:
+        raw = self._throttled.read()
+        if raw is None and self._vcgencmd and self._count % VCGENCMD_EVERY == 0:
+            try:        # older kernels: only the firmware knows, ask it rarely
+                out = subprocess.run([self._vcgencmd, "get_throttled"], capture_output=True,
+                                     text=True, timeout=2).stdout
+                m = re.search(r"0x[0-9a-fA-F]+", out)
+                raw = m.group(0) if m else None
+            except (OSError, subprocess.SubprocessError):
+                raw = None
+        if raw is not None:
+            try:
+                self._throttle = _throttle_flags(int(raw.strip(), 16))
+            except ValueError:
+                pass
+        return self._throttle
+
+    @staticmethod
+    def _usage(now: Tuple[int, int], prev: Optional[Tuple[int, int]]) -> Optional[float]:
+        if prev is None or now[1] == prev[1]:
+            return None
+        return round(100.0 * (1 - (now[0] - prev[0]) / (now[1] - prev[1])), 1)
+
+    def sample(self) -> Dict[str, Any]:
+        t = time.monotonic()
+        cpu, net, disk = self._cpu(), self._net(), self._disk()
+        prev = self._prev
+        self._prev = (t, cpu, net, disk)
+        dt = t - prev[0] if prev else 0.0
+
+        def rate(now, before):
+            return round((now - before) / dt) if dt > 0 else None
+
+        temp, freq = self._temp.read(), self._freq.read()
+        load = (self._loadavg.read() or "").split()[:3]
+        mem_used, mem_total = self._mem()
+        disk_used, disk_total = read_disk()
+        pcpu = prev[1] if prev else {}
+        snap = {
+            "ts": time.time(),
+            "cpu_temp": round(int(temp) / 1000, 1) if temp else None,
+            "cpu_freq": int(freq) // 1000 if freq else None,
+            "cpu_usage": self._usage(cpu["cpu"], pcpu.get("cpu")) if "cpu" in cpu else None,
+            "cpu_cores": [self._usage(v, pcpu.get(k)) for k, v in cpu.items() if k != "cpu"],
+            "load": [float(x) for x in load] or None,
+            "mem_used": mem_used,
+            "mem_total": mem_total,
+            "disk_used": disk_used,
+            "disk_total": disk_total,
+            "net_rx_bps": rate(net[0], prev[2][0]) if prev else None,
+            "net_tx_bps": rate(net[1], prev[2][1]) if prev else None,
+            "disk_read_bps": rate(disk[0], prev[3][0]) if prev else None,
+            "disk_write_bps": rate(disk[1], prev[3][1]) if prev else None,
+            "throttled": self._throttling(),
+        }
+        self._count += 1
+        self._snapshot = snap
+        self.history.append({k: v for k, v in snap.items()
+                             if k not in ("cpu_cores", "throttled", "disk_total", "mem_total")})
+        return snap
+
+
+_sampler: Optional[PiSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def sampler() -> PiSampler:
+    """The process-wide ``PiSampler``, started on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = PiSampler().start()
+    return _sampler
+
+
 def get_telemetry():
-    """Gather Raspberry Pi telemetry data."""
-    mem_used, mem_total = read_memory()
-    disk_used, disk_total = read_disk()
-    return {
-        'cpu_temp': read_cpu_temp(),
-        'cpu_freq': read_cpu_freq(),
-        'cpu_usage': read_cpu_usage(),
-        'mem_used': mem_used,
-        'mem_total': mem_total,
-        'disk_used': disk_used,
-        'disk_total': disk_total,
-    }
+    """Latest Raspberry Pi telemetry from the background sampler."""
+    return sampler().snapshot()
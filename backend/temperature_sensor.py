@@ -5,6 +5,8 @@ log = logging.getLogger(__name__)
 
 BASE_DIR = '/sys/bus/w1/devices'
 
+_device = None  # detected sensor id, rescanned only after a failed read
+
 
 def _detect_device():
     try:
@@ -18,9 +20,10 @@ def _detect_device():
 
 def read_temperature(device_id=None):
     """Return temperature in Celsius from DS18B20 sensor if available."""
+    global _device
     if not os.path.exists(BASE_DIR):
         return None
-    dev = device_id or _detect_device()
+    dev = device_id or _device or _detect_device()
     if not dev:
         return None
     path = os.path.join(BASE_DIR, dev, 'w1_slave')
@@ -29,7 +32,11 @@ def read_temperature(device_id=None):
             data = f.read()
         if 't=' in data:
             temp_str = data.split('t=')[-1].strip()
+            if device_id is None:
+                _device = dev
             return round(int(temp_str) / 1000, 1)
     except Exception as e:  # pragma: no cover - hardware optional
         log.warning("Temperature read failed: %s", e)
+    if dev == _device:
+        _device = None
     return None
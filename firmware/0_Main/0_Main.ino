@@ -4,6 +4,7 @@
 #include <Adafruit_AHTX0.h>
 
 Telemetry data;
+uint16_t pollIntervalMs = POLL_INTERVAL_MS;
 
 void setup() {
   Serial.begin(115200);
@@ -40,7 +41,9 @@ static void printTempSensor(const char *name, const TemperatureSensorData &s, bo
 }
 
 void sendJson() {
-  Serial.print('{');
+  Serial.print("{\"ts\":");
+  Serial.print(data.ts);
+  Serial.print(',');
   printVoltageSensor("voltageSensorV3", data.voltageSensorV3);
   printVoltageSensor("voltageSensorV5", data.voltageSensorV5);
   printVoltageSensor("voltageSensorV5PiBrain", data.voltageSensorV5PiBrain);
@@ -52,13 +55,18 @@ void sendJson() {
 
 void loop() {
   static uint32_t lastPoll = 0;
+  pollCommands();   // every pass, so acks don't wait for the next poll
   uint32_t now = millis();
 
-  if (now - lastPoll >= 100) {
+  if (now - lastPoll >= pollIntervalMs) {
     lastPoll = now;
     pollSensors();
     updateActuators();
+#if TELEMETRY_BINARY
+    sendBinary();
+#else
     sendJson();
+#endif
     digitalWrite(LED_BUILTIN, !digitalRead(LED_BUILTIN));
   }
 }
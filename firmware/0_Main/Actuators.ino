@@ -12,22 +12,27 @@ void initActuators() {
   digitalWrite(PIN_RELAY2, LOW);
 }
 
-void setRelay(uint8_t pin, bool state) {
+// Returns false when the change was dropped by the 20 ms debounce.
+bool setRelay(uint8_t pin, bool state) {
   uint32_t now = millis();
   uint32_t debounce = 20;
+  bool *current;
+  uint32_t *lastChange;
   if (pin == PIN_RELAY1) {
-    if (state != stateRelay1 && now - lastChange1 >= debounce) {
-      digitalWrite(pin, state ? HIGH : LOW);
-      stateRelay1 = state;
-      lastChange1 = now;
-    }
+    current = &stateRelay1;
+    lastChange = &lastChange1;
   } else if (pin == PIN_RELAY2) {
-    if (state != stateRelay2 && now - lastChange2 >= debounce) {
-      digitalWrite(pin, state ? HIGH : LOW);
-      stateRelay2 = state;
-      lastChange2 = now;
-    }
+    current = &stateRelay2;
+    lastChange = &lastChange2;
+  } else {
+    return false;
   }
+  if (state == *current) return true;
+  if (now - *lastChange < debounce) return false;
+  digitalWrite(pin, state ? HIGH : LOW);
+  *current = state;
+  *lastChange = now;
+  return true;
 }
 
 void updateActuators() {
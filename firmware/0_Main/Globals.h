@@ -5,6 +5,20 @@ constexpr uint8_t PIN_RELAY1 = 22;
 constexpr uint8_t PIN_RELAY2 = 23;
 constexpr uint8_t PIN_BUTTON = 2;
 
+// 1: send telemetry as COBS framed binary records (Protocol.ino),
+// 0: send JSON lines. backend/protocol.py accepts both.
+#ifndef TELEMETRY_BINARY
+#define TELEMETRY_BINARY 0
+#endif
+
+// Sensor poll / telemetry period. The Pi reader drains the port in bulk and
+// keeps up with 10 ms (100 Hz); use binary telemetry below ~20 ms.
+#ifndef POLL_INTERVAL_MS
+#define POLL_INTERVAL_MS 100
+#endif
+// current period, changed at runtime by the set-poll command
+extern uint16_t pollIntervalMs;
+
 struct VoltageSensorData {
   float current;   // A
   float voltage;   // V
@@ -37,6 +51,9 @@ void pollSensors();
 
 void initActuators();
 void updateActuators();
-void setRelay(uint8_t pin, bool state);
+bool setRelay(uint8_t pin, bool state);
 
 bool buttonPressed();
+
+void sendBinary();
+void pollCommands();
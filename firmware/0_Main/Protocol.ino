@@ -0,0 +1,202 @@
+#include "Globals.h"
+
+// Binary telemetry frame, decoded by backend/protocol.py:
+//   COBS(type | record | crc16 little endian) 0x00
+// The record is the Telemetry struct packed without padding, little endian,
+// in declaration order (see backend/frame.py).
+//
+// Commands from the Pi use the same framing (backend/commands.py):
+//   COMMAND  seq:u16 | op:u8 | args           answered by
+//   ACK      seq:u16 | status:u8 | value:u32
+
+static constexpr uint8_t FRAME_TELEMETRY = 0x01;
+static constexpr uint8_t FRAME_COMMAND = 0x02;
+static constexpr uint8_t FRAME_ACK = 0x03;
+
+static constexpr uint8_t CMD_PING = 0x01;
+static constexpr uint8_t CMD_SET_RELAY = 0x02;   // relay:u8 (1 or 2), on:u8
+static constexpr uint8_t CMD_SET_POLL = 0x03;    // interval_ms:u16
+
+static constexpr uint8_t ACK_OK = 0;
+static constexpr uint8_t ACK_BAD_COMMAND = 1;
+static constexpr uint8_t ACK_BAD_ARGS = 2;
+static constexpr uint8_t ACK_BUSY = 3;       // relay switched < 20 ms ago
+static constexpr size_t RECORD_SIZE = 4 + 4 * 13 + 2 * 9 + 3;
+
+static uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;  // CRC-16/CCITT-FALSE
+  for (size_t i = 0; i < len; ++i) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t b = 0; b < 8; ++b) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+static size_t cobsEncode(const uint8_t *in, size_t len, uint8_t *out) {
+  size_t codeIdx = 0, o = 1;
+  uint8_t code = 1;
+  for (size_t i = 0; i < len; ++i) {
+    if (in[i] == 0) {
+      out[codeIdx] = code;
+      codeIdx = o++;
+      code = 1;
+    } else {
+      out[o++] = in[i];
+      if (++code == 0xFF) {
+        out[codeIdx] = code;
+        codeIdx = o++;
+        code = 1;
+      }
+    }
+  }
+  out[codeIdx] = code;
+  return o;
+}
+
+static uint8_t *putFloat(uint8_t *p, float v) {
+  memcpy(p, &v, sizeof v);
+  return p + sizeof v;
+}
+
+// Unavailable sensors are sent as zeros, like sendJson() prints them.
+static uint8_t *putVoltage(uint8_t *p, const VoltageSensorData &s) {
+  p = putFloat(p, s.isAvailable ? s.current : 0);
+  p = putFloat(p, s.isAvailable ? s.voltage : 0);
+  p = putFloat(p, s.isAvailable ? s.power : 0);
+  *p++ = s.isAvailable;
+  return p;
+}
+
+static uint8_t *putTemp(uint8_t *p, const TemperatureSensorData &s) {
+  p = putFloat(p, s.isAvailable ? s.temperature : 0);
+  p = putFloat(p, s.isAvailable ? s.humidity : 0);
+  *p++ = s.isAvailable;
+  return p;
+}
+
+void sendBinary() {
+  uint8_t payload[1 + RECORD_SIZE + 2];
+  uint8_t *p = payload;
+  *p++ = FRAME_TELEMETRY;
+  memcpy(p, &data.ts, sizeof data.ts);
+  p += sizeof data.ts;
+  p = putVoltage(p, data.voltageSensorV3);
+  p = putVoltage(p, data.voltageSensorV5);
+  p = putVoltage(p, data.voltageSensorV5PiBrain);
+  p = putVoltage(p, data.voltageSensorV24);
+  p = putTemp(p, data.temperatureSensor1);
+  p = putTemp(p, data.temperatureSensor2);
+  *p++ = data.relay1;
+  *p++ = data.relay2;
+  *p++ = data.button;
+  uint16_t crc = crc16(payload, p - payload);
+  *p++ = crc & 0xFF;
+  *p++ = crc >> 8;
+
+  uint8_t frame[sizeof payload + 2];
+  size_t n = cobsEncode(payload, p - payload, frame);
+  frame[n++] = 0x00;
+  Serial.write(frame, n);
+}
+
+
+// ---------------------------------------------------------------------------
+// Commands
+
+static size_t cobsDecode(const uint8_t *in, size_t len, uint8_t *out) {
+  size_t i = 0, o = 0;
+  while (i < len) {
+    uint8_t code = in[i];
+    if (code == 0 || i + code > len) return 0;
+    for (uint8_t k = 1; k < code; ++k) out[o++] = in[i + k];
+    i += code;
+    if (code < 0xFF && i < len) out[o++] = 0;
+  }
+  return o;
+}
+
+static void sendAck(uint16_t seq, uint8_t status, uint32_t value) {
+  uint8_t payload[1 + 2 + 1 + 4 + 2];
+  payload[0] = FRAME_ACK;
+  memcpy(payload + 1, &seq, 2);
+  payload[3] = status;
+  memcpy(payload + 4, &value, 4);
+  uint16_t crc = crc16(payload, 8);
+  payload[8] = crc & 0xFF;
+  payload[9] = crc >> 8;
+
+  uint8_t frame[sizeof payload + 2];
+  size_t n = cobsEncode(payload, sizeof payload, frame);
+  frame[n++] = 0x00;
+  Serial.write(frame, n);
+}
+
+static void handleCommand(const uint8_t *p, size_t len) {
+  // type | seq:2 | op | args | crc:2
+  if (len < 6 || p[0] != FRAME_COMMAND) return;
+  uint16_t crc = p[len - 2] | (p[len - 1] << 8);
+  if (crc16(p, len - 2) != crc) return;
+  uint16_t seq;
+  memcpy(&seq, p + 1, 2);
+  uint8_t op = p[3];
+  const uint8_t *args = p + 4;
+  size_t nargs = len - 6;
+
+  switch (op) {
+    case CMD_PING:
+      sendAck(seq, ACK_OK, millis());
+      break;
+    case CMD_SET_RELAY:
+      if (nargs != 2 || (args[0] != 1 && args[0] != 2)) {
+        sendAck(seq, ACK_BAD_ARGS, 0);
+        break;
+      }
+    {
+      uint8_t pin = args[0] == 1 ? PIN_RELAY1 : PIN_RELAY2;
+      bool applied = setRelay(pin, args[1]);
+      sendAck(seq, applied ? ACK_OK : ACK_BUSY, digitalRead(pin));
+      break;
+    }
+    case CMD_SET_POLL: {
+      uint16_t ms;
+      if (nargs != 2) {
+        sendAck(seq, ACK_BAD_ARGS, 0);
+        break;
+      }
+      memcpy(&ms, args, 2);
+      if (ms < 5) {
+        sendAck(seq, ACK_BAD_ARGS, pollIntervalMs);
+        break;
+      }
+      pollIntervalMs = ms;
+      sendAck(seq, ACK_OK, pollIntervalMs);
+      break;
+    }
+    default:
+      sendAck(seq, ACK_BAD_COMMAND, 0);
+  }
+}
+
+// Reads whatever the Pi sent; complete frames are handled right away.
+void pollCommands() {
+  static uint8_t raw[32];
+  static size_t n = 0;
+  static bool overflow = false;
+  while (Serial.available()) {
+    uint8_t b = Serial.read();
+    if (b != 0) {
+      if (n < sizeof raw) raw[n++] = b;
+      else overflow = true;
+      continue;
+    }
+    if (!overflow && n) {
+      uint8_t payload[sizeof raw];
+      size_t len = cobsDecode(raw, n, payload);
+      handleCommand(payload, len);
+    }
+    n = 0;
+    overflow = false;
+  }
+}
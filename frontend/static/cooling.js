@@ -1,19 +1,32 @@
 let interval = 1000;
 let timerId = null;
+let stream = null;
 
 function startTimer() {
   if (timerId) clearInterval(timerId);
   timerId = setInterval(fetchCooling, interval);
 }
 
+function startStream() {
+  if (stream) stream.close();
+  stream = liveStream(['sensors'], (_, data) => showCooling(data), () => {
+    fetchCooling();
+    startTimer();
+  }, interval);
+}
+
 document.getElementById('updateInterval')?.addEventListener('change', (e) => {
   interval = parseInt(e.target.value);
-  startTimer();
+  if (timerId) startTimer();
+  else startStream();
 });
 
 async function fetchCooling() {
   const resp = await fetch('/api/sensors');
-  const data = await resp.json();
+  showCooling(await resp.json());
+}
+
+function showCooling(data) {
   if (data.aht20) {
     for (let i = 1; i <= 2; i++) {
       const val = data.aht20[i];
@@ -36,6 +49,4 @@ async function fetchCooling() {
   }
 }
 
-fetchCooling();
-startTimer();
-
+startStream();
@@ -38,7 +38,10 @@ function pushData(chart, value) {
 
 async function fetchTelemetry() {
   const resp = await fetch('/api/telemetry');
-  const data = await resp.json();
+  showTelemetry(await resp.json());
+}
+
+function showTelemetry(data) {
   if (data.cpu_temp !== null) {
     pushData(cpuTempChart, data.cpu_temp);
     cpuTempValue.textContent = data.cpu_temp;
@@ -61,5 +64,7 @@ async function fetchTelemetry() {
   }
 }
 
-fetchTelemetry();
-setInterval(fetchTelemetry, 1000);
+liveStream(['pi'], (_, data) => showTelemetry(data), () => {
+  fetchTelemetry();
+  setInterval(fetchTelemetry, 1000);
+});
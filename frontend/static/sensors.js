@@ -1,20 +1,32 @@
 let interval = 1000;
 let timerId = null;
+let stream = null;
 
 function startTimer() {
   if (timerId) clearInterval(timerId);
   timerId = setInterval(fetchSensors, interval);
 }
 
+function startStream() {
+  if (stream) stream.close();
+  stream = liveStream(['sensors'], (_, data) => showSensors(data), () => {
+    fetchSensors();
+    startTimer();
+  }, interval);
+}
+
 document.getElementById('updateInterval')?.addEventListener('change', (e) => {
   interval = parseInt(e.target.value);
-  startTimer();
+  if (timerId) startTimer();
+  else startStream();
 });
 
 async function fetchSensors() {
   const resp = await fetch('/api/sensors');
-  const data = await resp.json();
+  showSensors(await resp.json());
+}
 
+function showSensors(data) {
   if (data.temperature !== undefined && data.temperature !== null) {
     document.getElementById('temperature').textContent = data.temperature;
   }
@@ -42,6 +54,4 @@ async function fetchSensors() {
   }
 }
 
-fetchSensors();
-startTimer();
-
+startStream();
@@ -0,0 +1,59 @@
+// Live updates pushed over /api/stream (Server-Sent Events).
+// onFallback is called once when the stream is unavailable, so the page
+// can go back to polling its regular endpoint.
+function liveStream(events, onEvent, onFallback, interval = 0, params = '') {
+  if (!window.EventSource) {
+    onFallback();
+    return null;
+  }
+  let url = `/api/stream?events=${events.join(',')}&interval=${interval}`;
+  if (params) url += '&' + params;
+  const source = new EventSource(url);
+  let failures = 0;
+  for (const name of events) {
+    source.addEventListener(name, (e) => {
+      failures = 0;
+      onEvent(name, JSON.parse(e.data));
+    });
+  }
+  source.onerror = () => {
+    // a non-200 answer (503: too many streams) closes it for good; otherwise
+    // EventSource reconnects by itself, so give up after repeated failures
+    if (source.readyState === EventSource.CLOSED || ++failures >= 3) {
+      source.close();
+      onFallback();
+    }
+  };
+  return source;
+}
+
+// Client side of the telemetry delta protocol (backend/delta.py).
+class DeltaClient {
+  constructor() {
+    this.epoch = null;
+    this.seq = null;
+    this.fields = {};
+  }
+
+  // query string for /api/teency asking for changes since the last message
+  query() {
+    return this.seq === null ? 'delta=1' : `since=${this.seq}&epoch=${this.epoch}`;
+  }
+
+  // apply one delta message and return the rebuilt nested object
+  apply(d) {
+    if (d.full) this.fields = {};
+    Object.assign(this.fields, d.set, d.meta);
+    for (const key of d.del || []) delete this.fields[key];
+    this.epoch = d.epoch;
+    this.seq = d.seq;
+    const out = {};
+    for (const [path, value] of Object.entries(this.fields)) {
+      const keys = path.split('.');
+      let node = out;
+      for (const k of keys.slice(0, -1)) node = node[k] = node[k] || {};
+      node[keys[keys.length - 1]] = value;
+    }
+    return out;
+  }
+}
@@ -1,32 +1,45 @@
 let interval = 500;
 let timerId = null;
+let stream = null;
+const deltas = new DeltaClient();
 
 function startTimer() {
   if (timerId) clearInterval(timerId);
   timerId = setInterval(fetchTeency, interval);
 }
 
+function startStream() {
+  if (stream) stream.close();
+  stream = liveStream(['teency'], (_, d) => showTeency(deltas.apply(d)), () => {
+    fetchTeency();
+    startTimer();
+  }, interval, 'delta=1');
+}
+
 document.getElementById('updateInterval')?.addEventListener('change', (e) => {
   interval = parseInt(e.target.value);
-  startTimer();
+  if (timerId) startTimer();
+  else startStream();
 });
 
 async function fetchTeency() {
   try {
-    const resp = await fetch('/api/teency');
-    const data = await resp.json();
-    document.getElementById('teencyJson').textContent =
-      JSON.stringify(data, null, 2);
-    const status = data.status || 'error';
-    document.getElementById('status').textContent = status;
-    const errorBox = document.getElementById('teencyError');
-    if (status !== 'ok') errorBox.classList.remove('d-none');
-    else errorBox.classList.add('d-none');
+    const resp = await fetch('/api/teency?' + deltas.query());
+    showTeency(deltas.apply(await resp.json()));
   } catch (e) {
     document.getElementById('status').textContent = 'error';
     document.getElementById('teencyError').classList.remove('d-none');
   }
 }
 
-fetchTeency();
-startTimer();
+function showTeency(data) {
+  document.getElementById('teencyJson').textContent =
+    JSON.stringify(data, null, 2);
+  const status = data.status || 'error';
+  document.getElementById('status').textContent = status;
+  const errorBox = document.getElementById('teencyError');
+  if (status !== 'ok') errorBox.classList.remove('d-none');
+  else errorBox.classList.add('d-none');
+}
+
+startStream();
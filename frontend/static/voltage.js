@@ -7,21 +7,55 @@ const sensors = {
 
 let interval = 500;
 let timerId = null;
+let stream = null;
+const deltas = new DeltaClient();
 
 function startTimer() {
   if (timerId) clearInterval(timerId);
-  timerId = setInterval(fetchVoltages, interval);
+  timerId = setInterval(() => {
+    fetchVoltages();
+    fetchAlerts();
+  }, interval);
+}
+
+function startStream() {
+  if (stream) stream.close();
+  stream = liveStream(['teency', 'alerts'], (name, d) => {
+    if (name === 'alerts') showAlerts(d);
+    else showVoltages(deltas.apply(d));
+  }, () => {
+    fetchVoltages();
+    startTimer();
+  }, interval, 'delta=1');
 }
 
 document.getElementById('updateInterval')?.addEventListener('change', (e) => {
   interval = parseInt(e.target.value);
-  startTimer();
+  if (timerId) startTimer();
+  else { fetchAlerts(); startStream(); }
 });
 
 async function fetchVoltages() {
-  const resp = await fetch('/api/teency');
-  const data = await resp.json();
+  const resp = await fetch('/api/teency?' + deltas.query());
+  showVoltages(deltas.apply(await resp.json()));
+}
+
+async function fetchAlerts() {
+  const resp = await fetch('/api/alerts');
+  showAlerts(await resp.json());
+}
+
+function showAlerts(status) {
+  const box = document.getElementById('alerts');
+  box.replaceChildren(...status.active.map((a) => {
+    const div = document.createElement('div');
+    div.className = `alert mb-2 ${a.level === 'critical' ? 'alert-danger' : 'alert-warning'}`;
+    div.textContent = `${a.rule}: ${a.field}`;
+    return div;
+  }));
+}
 
+function showVoltages(data) {
   for (const [key, prefix] of Object.entries(sensors)) {
     const s = data[key] || {};
     document.getElementById(prefix + 'voltage').textContent =
@@ -35,5 +69,5 @@ async function fetchVoltages() {
   }
 }
 
-fetchVoltages();
-startTimer();
+fetchAlerts();
+startStream();
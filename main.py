@@ -1,6 +1,10 @@
-import importlib, logging, time
-from multiprocessing import Process, Queue
+import importlib, logging, shutil, signal, time
+from multiprocessing import Process
 from logging.handlers import RotatingFileHandler
+from backend import metrics
+from backend.bus import TelemetryBus
+from backend.frame_store import FrameHistory, FrameStore
+from backend.metrics import METRICS_DIR
 
 workers = {
     # single UART reader
@@ -11,6 +15,68 @@ workers = {
     # flask web api
     "flask":       "backend.app",
 }
+# workers that need every packet; the others read the latest frame
+# from shared memory (backend.frame_store)
+subscribers = ("logger", "flask")
+
+RESTART_DELAY = (0.5, 30.0)   # s before a restart: first, max (doubles per crash)
+STABLE_AFTER  = 60.0          # s of uptime after which the delay starts over
+CHECK_EVERY   = 0.3
+EXPORT_EVERY  = 2.0
+
+class Worker:
+    """One supervised process; restarted on its own when it dies.
+
+    Everything a worker needs to resume lives in this process and survives
+    the crash: its bus pipe keeps buffering (~40 s, more than the longest
+    delay), the latest frame and recent history stay in shared memory.
+    """
+
+    def __init__(self, name, mod, arg):
+        self.name, self.mod, self.arg = name, mod, arg
+        self.proc      = None
+        self.restarts  = 0
+        self.started   = 0.0
+        self.delay     = RESTART_DELAY[0]
+        self.restart_at = None        # monotonic time of a pending restart
+
+    def start(self):
+        self.proc = Process(target=self.mod.run, args=(self.arg,), name=self.name, daemon=True)
+        self.proc.start()
+        self.started, self.restart_at = time.monotonic(), None
+
+    def check(self, now):
+        if self.restart_at is None:
+            if self.proc.is_alive(): return
+            up = now - self.started
+            if up >= STABLE_AFTER: self.delay = RESTART_DELAY[0]
+            logging.error("%s died (%s) after %.0f s, restart in %.1f s",
+                          self.name, self.proc.exitcode, up, self.delay)
+            self.restart_at = now + self.delay
+            self.delay = min(self.delay * 2, RESTART_DELAY[1])
+        elif now >= self.restart_at:
+            self.restarts += 1
+            self.start()
+            logging.info("%s restarted (pid %d, restart %d)", self.name, self.proc.pid, self.restarts)
+
+    def stop(self):
+        if self.restart_at is None: self.proc.terminate()
+
+    def status(self, now):
+        """Metrics in the ``metrics.snapshot()`` format, labelled by process."""
+        up = self.restart_at is None
+        labels = {"process": self.name}
+        return [
+            {"name": "worker_up", "type": "gauge", "help": "1 while the worker runs",
+             "labels": labels, "value": int(up)},
+            {"name": "worker_uptime_seconds", "type": "gauge", "help": "Since the last (re)start",
+             "labels": labels, "value": round(now - self.started, 1) if up else 0.0},
+            {"name": "worker_restarts_total", "type": "counter", "help": "Restarts after a crash",
+             "labels": labels, "value": self.restarts},
+        ]
+
+def _stop(signum, frame):
+    raise SystemExit
 
 def main():
     handler = RotatingFileHandler("system.log", maxBytes=1_000_000, backupCount=5)
@@ -19,24 +85,36 @@ def main():
         format="%(asctime)s %(name)s %(levelname)s: %(message)s",
         handlers=[handler],
     )
-    q = Queue(maxsize=200)
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)   # snapshots of the last run
+    store = FrameStore.create()
+    hist  = FrameHistory.create()   # handed to restarted workers
+    bus = TelemetryBus()      # every subscriber gets its own pipe
+    subs = {name: bus.subscribe(name) for name in subscribers}
     procs = []
     for name, mp in workers.items():
-        mod = importlib.import_module(mp)
-        p   = Process(target=mod.run, args=(q,), name=name, daemon=True)
-        p.start();  procs.append(p)
+        t0  = time.perf_counter()
+        mod = importlib.import_module(mp)   # hardware drivers load later, on use
+        logging.info("%s imported in %.0f ms", name, (time.perf_counter() - t0) * 1000)
+        w   = Worker(name, mod, bus if name == "reader" else subs.get(name))
+        w.start();  procs.append(w)
 
-    try:                       # supervisor loop
+    signal.signal(signal.SIGTERM, _stop)
+    exported = 0.0
+    try:                       # supervisor loop: restart only what died
         while True:
-            time.sleep(0.3)
-            for p in procs[:]:
-                if not p.is_alive():
-                    logging.error("%s died (%s)", p.name, p.exitcode)
-                    raise RuntimeError
-    except (KeyboardInterrupt, RuntimeError):
+            time.sleep(CHECK_EVERY)
+            now = time.monotonic()
+            for w in procs: w.check(now)
+            if now - exported >= EXPORT_EVERY:
+                exported = now
+                try: metrics.export("supervisor", [m for w in procs for m in w.status(now)])
+                except OSError as e: logging.warning("metrics export failed: %s", e)
+    except (KeyboardInterrupt, SystemExit):
         logging.info("shutting down …")
-        for p in procs: p.terminate()
-        for p in procs: p.join()
+        for w in procs: w.stop()
+        for w in procs: w.proc.join()
+        store.close(); store.unlink()
+        hist.close(); hist.unlink()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,29 @@
+"""Decimation never returns more points than asked for."""
+
+from backend.downsample import lttb, minmax
+
+
+def test_lttb_few_points():
+    t = list(range(100))
+    v = [x * x for x in t]
+    assert lttb(t, v, 2) == ([0, 99], [0, 9801])
+    assert lttb(t, v, 1) == ([0], [0])
+    assert lttb(t, v, 0) == ([], [])
+
+
+def test_lttb_bounds():
+    t = list(range(1000))
+    v = [(x * 37) % 101 for x in t]
+    for n in (3, 10, 500):
+        out_t, out_v = lttb(t, v, n)
+        assert len(out_t) == len(out_v) == n
+        assert out_t[0] == 0 and out_t[-1] == 999
+    assert lttb(t[:5], v[:5], 10) == (t[:5], v[:5])
+
+
+def test_minmax_keeps_extremes():
+    t = list(range(100))
+    v = [(x * 37) % 101 for x in t]
+    out_t, lo, hi = minmax(t, v, v, 10)
+    assert len(out_t) == 10
+    assert min(lo) == min(v) and max(hi) == max(v)
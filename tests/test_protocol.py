@@ -0,0 +1,82 @@
+"""Decoder round trips over the mixed JSON / COBS stream."""
+
+import json
+import random
+
+from backend import frame, protocol
+
+
+def _packet(rng):
+    def val(hi, decimals):      # zeros now and then move the COBS code byte around
+        return 0.0 if rng.random() < 0.2 else round(rng.uniform(-hi, hi), decimals)
+
+    pkt = {"ts": rng.randrange(1 << rng.choice((16, 24, 32)))}
+    for s in frame.VOLTAGE_SENSORS:
+        pkt[s] = {"current": val(5, 3), "voltage": val(30, 3), "power": val(100, 3),
+                  "isAvailable": rng.random() < 0.9}
+    for s in frame.TEMP_SENSORS:
+        pkt[s] = {"temperature": val(80, 1), "humidity": val(100, 1),
+                  "isAvailable": rng.random() < 0.9}
+    for f in frame.FLAGS:
+        pkt[f] = rng.random() < 0.5
+    return pkt
+
+
+def _feed(dec, data, rng):
+    out, i = [], 0
+    while i < len(data):
+        n = rng.randint(1, 200)
+        out += dec.feed(data[i:i + n])
+        i += n
+    return out
+
+
+def test_binary_round_trip():
+    rng = random.Random(1)
+    pkts = [_packet(rng) for _ in range(5000)]
+    wire = b"".join(protocol.encode_telemetry(p) for p in pkts)
+    assert 0x0A in {f[0] for f in (protocol.encode_telemetry(p) for p in pkts)}
+    dec = protocol.Decoder()
+    got = _feed(dec, wire, rng)
+    assert dec.errors == 0
+    assert got == [{"type": "telemetry", **p} for p in pkts]
+
+
+def test_random_payload_round_trip():
+    rng = random.Random(3)
+    cmds = []
+    for seq in range(5000):
+        args = bytes(rng.choice((0, rng.randrange(256))) for _ in range(rng.randrange(60)))
+        cmds.append({"type": "command", "seq": seq, "op": rng.randrange(256), "args": args})
+    frames = [protocol.encode_command(c["seq"], c["op"], c["args"]) for c in cmds]
+    assert {0x0A, 0x0D} <= {f[0] for f in frames}   # code bytes that look like CR/LF
+    dec = protocol.Decoder()
+    assert _feed(dec, b"".join(frames), rng) == cmds
+    assert dec.errors == 0
+
+
+def test_code_byte_newline():
+    pkt = {"ts": 0x01020304, "voltageSensorV3": {"current": 1.1, "voltage": 5.0}}
+    wire = protocol.encode_telemetry(pkt)
+    assert wire[0] == 0x0A
+    dec = protocol.Decoder()
+    assert len(dec.feed(wire)) == 1 and dec.errors == 0
+
+
+def test_mixed_stream():
+    rng = random.Random(2)
+    pkts = [_packet(rng) for _ in range(200)]
+    wire, want = bytearray(b"}, \"relay2\": false}\r\n"), []    # joined mid-line
+    for i, p in enumerate(pkts):
+        if i % 3 == 0:
+            wire += json.dumps(p).encode() + b"\r\n\r\n"
+            want.append({"type": "telemetry", **p})
+        else:
+            wire += protocol.encode_telemetry(p)
+            want.append({"type": "telemetry", **p})
+        if i % 7 == 0:
+            wire += protocol.encode_ack(i, protocol.ACK_OK, i)
+            want.append({"type": "ack", "seq": i, "status": protocol.ACK_OK, "value": i})
+    dec = protocol.Decoder()
+    assert _feed(dec, bytes(wire), rng) == want
+    assert dec.errors == 0
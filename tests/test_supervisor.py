@@ -0,0 +1,114 @@
+"""main.py under the Teensy simulator: a killed worker is restarted warm.
+
+Slow (~40 s): waits for two periodic energy.json saves.
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("serial")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    out = []
+    for d in os.listdir("/proc"):
+        try:
+            with open(f"/proc/{d}/stat") as f:
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    out.append(int(d))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def _listener(pids, port):
+    """The pid among ``pids`` with a listening socket on ``port``."""
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        with open(table) as f:
+            for line in list(f)[1:]:
+                cols = line.split()
+                if int(cols[1].rsplit(":", 1)[1], 16) == port and cols[3] == "0A":
+                    inodes.add(cols[9])
+    for pid in pids:
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                link = os.readlink(f"/proc/{pid}/fd/{fd}")
+            except OSError:
+                continue
+            if link.startswith("socket:[") and link[8:-1] in inodes:
+                return pid
+    return None
+
+
+def _wait(cond, timeout, step=0.2):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        value = cond()
+        if value:
+            return value
+        time.sleep(step)
+    return None
+
+
+def _total(path):
+    try:
+        with open(path) as f:
+            return sum(json.load(f)["total"])
+    except (OSError, ValueError, KeyError):
+        return 0.0
+
+
+def test_restarted_flask_keeps_energy(tmp_path):
+    port = _free_port()
+    tty = str(tmp_path / "ttyTEENSY")
+    env = {**os.environ, "PYTHONPATH": ROOT, "TEENSY_PORT": tty, "HTTP_PORT": str(port)}
+    sim = subprocess.Popen([sys.executable, "-m", "backend.simulator", "--rate", "100",
+                            "--link", tty], cwd=tmp_path, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    main = None
+    try:
+        assert _wait(lambda: os.path.exists(tty), 10)
+        main = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")],
+                                cwd=tmp_path, env=env)
+        energy = str(tmp_path / "energy.json")
+        before = _wait(lambda: _total(energy), 30)
+        assert before, "no energy saved"
+
+        def flask_pid():
+            return _listener(_children(main.pid), port)
+
+        flask = _wait(flask_pid, 10)
+        assert flask
+        os.kill(flask, signal.SIGKILL)
+        assert _wait(lambda: flask_pid() not in (None, flask), 15), "flask not restarted"
+        saved = os.path.getmtime(energy)
+        assert _wait(lambda: os.path.getmtime(energy) > saved, 20), "no save after restart"
+        assert _total(energy) >= before
+        assert main.poll() is None, "main.py exited instead of restarting flask"
+    finally:
+        if main is not None:
+            main.send_signal(signal.SIGTERM)
+            main.wait(15)
+        sim.terminate()
+        sim.wait(5)